@@ -0,0 +1,212 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import argparse
+import os
+import subprocess
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.offsetbox import AnnotationBbox
+
+import process_data
+import finalize_visualization as renderer
+import snapshot_store
+
+# Default animation settings
+frame_count = 150
+fps = 30
+animation_dpi = 80
+figure_size = (16, 12)
+avatar_zoom = 0.1
+top_n = 20
+
+# Load the season trajectories of the top players at the latest snapshot
+def load_trajectories(store, top_n=top_n, min_games=process_data.min_games):
+    history = store.history()
+    if history.empty:
+        raise ValueError(f"No snapshots found in {store.root}")
+
+    dates = sorted(history['SNAPSHOT_DATE'].unique())
+    latest = store.as_of(dates[-1])
+    players = process_data.select_top_players(process_data.filter_players(latest, min_games), top_n)
+    player_ids = players['PLAYER_ID'].tolist()
+
+    # One row per date and player, forward filled over dates where the player did not change
+    rows = history[history['PLAYER_ID'].isin(player_ids)]
+    rows = rows.drop_duplicates(['SNAPSHOT_DATE', 'PLAYER_ID'], keep='last')
+    coordinates = []
+    for column in ('FGA', 'PTS'):
+        table = rows.pivot(index='SNAPSHOT_DATE', columns='PLAYER_ID', values=column)
+        table = table.reindex(index=dates, columns=player_ids).ffill()
+        coordinates.append(table.to_numpy(dtype=float))
+
+    # Players with no rows yet start the season at zero
+    positions = np.nan_to_num(np.stack(coordinates, axis=-1), nan=0.0)
+    return dates, players, positions
+
+# Spread the snapshot positions over a fixed number of frames with linear tweening
+def interpolate_frames(positions, frame_count=frame_count):
+    steps = np.linspace(0, len(positions) - 1, frame_count)
+    lower = np.floor(steps).astype(int)
+    upper = np.minimum(lower + 1, len(positions) - 1)
+    weight = (steps - lower)[:, None, None]
+    return positions[lower] * (1 - weight) + positions[upper] * weight, lower
+
+# Fixed axis limits over the whole animation, split at the final medians
+def animation_bounds(frames):
+    final = frames[-1]
+    return {
+        'y_split': float(np.median(final[:, 1])),
+        'x_split': float(np.median(final[:, 0])),
+        'y_max': float(frames[:, :, 1].max()) * 1.05,
+        'y_min': float(frames[:, :, 1].min()) * 0.95,
+        'x_max': float(frames[:, :, 0].max()) * 1.05,
+        'x_min': float(frames[:, :, 0].min()) * 0.95,
+    }
+
+# A quadrant chart whose static background is drawn once; each frame only
+# restores the saved background and redraws the moving artists (blitting)
+class QuadrantScene:
+    def __init__(self, spec):
+        self.spec = spec
+        bounds = spec['bounds']
+        start = spec['frames'][0]
+
+        self.fig = plt.figure(figsize=figure_size, dpi=spec['dpi'])
+        self.ax = self.fig.add_subplot(111)
+        renderer.draw_quadrant_background(self.ax, bounds)
+        self.ax.set_xlim(bounds['x_min'], bounds['x_max'])
+        self.ax.set_ylim(bounds['y_min'], bounds['y_max'])
+
+        # Moving artists are marked animated so the background draw skips them
+        self.points = self.ax.scatter(start[:, 0], start[:, 1], s=100, alpha=0.7, animated=True)
+        self.avatars = []
+        self.labels = []
+        for i, (name, path) in enumerate(zip(spec['names'], spec['avatar_paths'])):
+            if path and os.path.exists(path):
+                ab = AnnotationBbox(renderer.get_image(path, zoom=spec['zoom']), tuple(start[i]),
+                                   frameon=True,
+                                   pad=0.2,
+                                   bboxprops=dict(boxstyle="round,pad=0.3", fc="white", ec="black", lw=1),
+                                   animated=True)
+                self.ax.add_artist(ab)
+                self.avatars.append((i, ab))
+            label = self.ax.annotate(name, tuple(start[i]), xytext=(0, -25), textcoords='offset points',
+                                     ha='center', fontsize=8, weight='bold', animated=True)
+            self.labels.append(label)
+        # The quadrant labels do not move, but are redrawn over the avatars every frame
+        self.quadrant_labels = renderer.draw_quadrant_labels(self.ax, bounds)
+        for text in self.quadrant_labels:
+            text.set_animated(True)
+        self.date_text = self.ax.text(0.02, 0.98, '', transform=self.ax.transAxes, ha='left', va='top',
+                                      fontsize=18, weight='bold', animated=True)
+
+        self.fig.tight_layout()
+
+        # Draw the static background once and keep a copy of it
+        self.fig.canvas.draw()
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    # Render one frame and return its raw RGB bytes
+    def render(self, index):
+        positions = self.spec['frames'][index]
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+
+        self.points.set_offsets(positions)
+        self.ax.draw_artist(self.points)
+        for i, ab in self.avatars:
+            ab.xy = ab.xybox = tuple(positions[i])
+            self.ax.draw_artist(ab)
+        for label, position in zip(self.labels, positions):
+            label.xy = tuple(position)
+            self.ax.draw_artist(label)
+        for text in self.quadrant_labels:
+            self.ax.draw_artist(text)
+        self.date_text.set_text(self.spec['frame_dates'][index])
+        self.ax.draw_artist(self.date_text)
+
+        return np.asarray(canvas.buffer_rgba())[:, :, :3].tobytes()
+
+# Each worker process builds its own scene once and reuses it for every chunk
+worker_scene = None
+
+def init_worker(spec):
+    global worker_scene
+    worker_scene = QuadrantScene(spec)
+
+def render_chunk(frame_indices):
+    return [worker_scene.render(index) for index in frame_indices]
+
+# Build the ffmpeg command that encodes raw RGB frames read from stdin
+def encoder_command(output_path, width, height, fps=fps):
+    extension = os.path.splitext(output_path)[1].lower()
+    command = ['ffmpeg', '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-']
+    # yuv420p needs even frame dimensions
+    even_pad = 'pad=ceil(iw/2)*2:ceil(ih/2)*2'
+    if extension == '.gif':
+        command += ['-vf', 'split[a][b];[a]palettegen[p];[b][p]paletteuse']
+    elif extension == '.mp4':
+        command += ['-vf', even_pad, '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-preset', 'fast']
+    elif extension == '.webm':
+        command += ['-vf', even_pad, '-c:v', 'libvpx-vp9', '-pix_fmt', 'yuv420p', '-b:v', '0', '-crf', '32', '-row-mt', '1']
+    else:
+        raise ValueError(f"Unsupported animation format: {extension} (use .gif, .mp4 or .webm)")
+    return command + [output_path]
+
+# Render the season animation in parallel chunks and stream the frames to the encoder in order
+def render_animation(output_path, store=None, frame_count=frame_count, fps=fps, dpi=animation_dpi,
+                     top_n=top_n, workers=None, chunk_size=10):
+    store = store or snapshot_store.SnapshotStore()
+    dates, players, positions = load_trajectories(store, top_n)
+    frames, date_index = interpolate_frames(positions, frame_count)
+
+    spec = {
+        'frames': frames,
+        'frame_dates': [dates[i] for i in date_index],
+        'bounds': animation_bounds(frames),
+        'names': players['PLAYER_NAME'].tolist(),
+        'avatar_paths': [process_data.get_avatar_path(player_id, name)
+                         for player_id, name in zip(players['PLAYER_ID'], players['PLAYER_NAME'])],
+        'dpi': dpi,
+        'zoom': avatar_zoom,
+    }
+    width, height = int(figure_size[0] * dpi), int(figure_size[1] * dpi)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    encoder = subprocess.Popen(encoder_command(output_path, width, height, fps), stdin=subprocess.PIPE)
+    chunks = [range(start, min(start + chunk_size, frame_count)) for start in range(0, frame_count, chunk_size)]
+
+    try:
+        with Pool(workers or os.cpu_count(), initializer=init_worker, initargs=(spec,)) as pool:
+            for chunk in pool.imap(render_chunk, chunks):
+                for frame in chunk:
+                    encoder.stdin.write(frame)
+    finally:
+        encoder.stdin.close()
+        encoder.wait()
+
+    if encoder.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with status {encoder.returncode}")
+    return output_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Animate player trajectories across the PTS vs FGA quadrants.')
+    parser.add_argument('output', nargs='?', default='output/nba_quadrant_trajectories.mp4',
+                        help='Output file (.gif, .mp4 or .webm)')
+    parser.add_argument('--frames', type=int, default=frame_count)
+    parser.add_argument('--fps', type=int, default=fps)
+    parser.add_argument('--dpi', type=int, default=animation_dpi)
+    parser.add_argument('--top', type=int, default=top_n, help='Number of players to animate')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    print("Rendering quadrant trajectory animation...")
+    start = time.perf_counter()
+    render_animation(args.output, frame_count=args.frames, fps=args.fps, dpi=args.dpi,
+                     top_n=args.top, workers=args.workers)
+    print(f"Animation saved to {args.output} in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,251 @@
+import json
+import os
+import re
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import requests
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+# Known fallback (silhouette) headshot hashes, as {hex hash: label}
+fallback_table_path = 'data/fallback_hashes.json'
+
+# The silhouette the CDN serves for players without a photo, which seeds the table
+fallback_image_url = 'https://cdn.nba.com/headshots/nba/latest/1040x760/fallback.png'
+fallback_image_label = 'cdn silhouette'
+
+# Players whose headshot was a fallback, with when to try the CDN again, as
+# {image store: {player ID: entry}}
+recheck_path = 'data/avatar_rechecks.json'
+
+# Image stores with their own recheck records: the scraper's CDN headshots and
+# the chart avatars of process_data.py. A player can have a real photo in one
+# and a fallback in the other.
+headshot_store = 'images'
+avatar_store = 'images/avatars'
+
+# Days to wait before asking the CDN again for a flagged player
+recheck_days = 7
+
+# Hashes within this many differing bits (of 64) are treated as the same image
+match_threshold = 6
+
+# An image shared by this many different players can only be the CDN's generic silhouette
+shared_hash_players = 3
+
+# PNG text chunk that marks avatars drawn by process_data.create_placeholder_avatar
+placeholder_source = 'nba-placeholder'
+
+# Size and background color of a generated placeholder, for files saved without the marker
+placeholder_size = (100, 100)
+placeholder_color = (200, 200, 200)
+
+# Save an avatar, keeping the placeholder marker in the PNG if the image has one
+def save_avatar(image, path):
+    pnginfo = None
+    if image.info.get('Source') == placeholder_source:
+        pnginfo = PngInfo()
+        pnginfo.add_text('Source', placeholder_source)
+    image.save(path, pnginfo=pnginfo)
+
+# Whether an image is one of our own generated placeholders rather than a CDN image
+def is_generated_placeholder(image):
+    if image.info.get('Source') == placeholder_source:
+        return True
+    if image.size != placeholder_size or image.mode != 'RGB':
+        return False
+    corners = [(0, 0), (image.width - 1, 0), (0, image.height - 1), (image.width - 1, image.height - 1)]
+    return all(image.getpixel(corner) == placeholder_color for corner in corners)
+
+# Flatten transparency onto white, the way the chart shows it
+def flatten(image):
+    image = image.convert('RGBA')
+    background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+    return Image.alpha_composite(background, image).convert('L')
+
+# Difference hash (dHash) of many images at once: each image is shrunk to a
+# 9x8 grayscale thumbnail and every bit records whether a pixel is brighter
+# than its right-hand neighbor
+def dhash_images(images):
+    if not images:
+        return np.zeros(0, dtype=np.uint64)
+    pixels = np.stack([
+        np.asarray(flatten(image).resize((9, 8), Image.LANCZOS), dtype=np.int16)
+        for image in images
+    ])
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(images), 64), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+# dHash of image files; unreadable files get a hash of 0. With
+# with_placeholders, also return a mask of our own generated placeholders.
+def dhash_files(paths, with_placeholders=False):
+    images, readable = [], []
+    placeholders = np.zeros(len(paths), dtype=bool)
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                placeholders[i] = is_generated_placeholder(image)
+                images.append(flatten(image))
+            readable.append(i)
+        except Exception as e:
+            print(f"Error reading image {path}: {e}")
+
+    hashes = np.zeros(len(paths), dtype=np.uint64)
+    hashes[readable] = dhash_images(images)
+    if with_placeholders:
+        return hashes, placeholders
+    return hashes
+
+# Number of differing bits between every hash and every reference hash
+def hamming_distances(hashes, references):
+    xor = np.asarray(hashes, dtype=np.uint64)[:, None] ^ np.asarray(references, dtype=np.uint64)[None, :]
+    return np.unpackbits(xor.view(np.uint8).reshape(*xor.shape, 8), axis=-1).sum(axis=-1)
+
+def load_json(path, default):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return default
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+# Recheck records by image store. Records from before the stores were kept
+# apart are keyed by player ID alone; only attach_avatars flagged those as
+# placeholders, so such entries move to the avatar store and the rest are
+# left for the next scan to find again.
+def load_rechecks(path=recheck_path):
+    records = load_json(path, {})
+    for key in [key for key in records if key.isdigit()]:
+        entry = records.pop(key)
+        if entry.get('placeholder', False):
+            records.setdefault(avatar_store, {}).setdefault(key, entry)
+    return records
+
+def load_fallback_table(path=fallback_table_path):
+    return load_json(path, {})
+
+# Add a known fallback image (e.g. a saved silhouette) to the table
+def register_fallback(image_path, label='silhouette', path=fallback_table_path):
+    table = load_fallback_table(path)
+    table[format(int(dhash_files([image_path])[0]), '016x')] = label
+    save_json(path, table)
+    return table
+
+# Add the CDN's own silhouette to the table once, so downloads can be checked
+# before any scan has learned a fallback from players sharing an image
+def seed_fallback_table(path=fallback_table_path, url=fallback_image_url):
+    table = load_fallback_table(path)
+    if fallback_image_label in table.values():
+        return table
+    try:
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        with Image.open(BytesIO(response.content)) as image:
+            table[format(int(dhash_images([image])[0]), '016x')] = fallback_image_label
+        save_json(path, table)
+    except Exception as e:
+        print(f"Could not fetch the CDN fallback headshot: {e}")
+    return table
+
+# Boolean mask of the hashes that match a known fallback
+def match_fallbacks(hashes, table=None):
+    table = load_fallback_table() if table is None else table
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if not table or not len(hashes):
+        return np.zeros(len(hashes), dtype=bool)
+    references = np.array([int(key, 16) for key in table], dtype=np.uint64)
+    return (hamming_distances(hashes, references) <= match_threshold).any(axis=1) & (hashes != 0)
+
+# Check a single downloaded image
+def is_fallback_image(image, table=None):
+    return bool(match_fallbacks(dhash_images([image]), table)[0])
+
+# Record that a player's headshot in an image store is a fallback and schedule
+# a cheap recheck. placeholder says whether the stored avatar has already been replaced.
+def flag_player(player_id, store, placeholder=False, path=recheck_path, now=None):
+    records = load_rechecks(path)
+    now = pd.Timestamp(now or pd.Timestamp.now())
+    records.setdefault(store, {})[str(player_id)] = {
+        'flagged_at': now.isoformat(),
+        'next_check': (now + pd.Timedelta(days=recheck_days)).isoformat(),
+        'placeholder': placeholder,
+    }
+    save_json(path, records)
+
+# Note that a flagged player's stored avatar is now a placeholder
+def mark_placeholder(player_id, store, path=recheck_path):
+    records = load_rechecks(path)
+    entry = records.get(store, {}).get(str(player_id))
+    if entry is not None:
+        entry['placeholder'] = True
+        save_json(path, records)
+
+def recheck_entry(player_id, store, path=recheck_path):
+    return load_rechecks(path).get(store, {}).get(str(player_id))
+
+# Whether a flagged player's stored avatar is still the fallback image
+def needs_placeholder(player_id, store, path=recheck_path):
+    entry = recheck_entry(player_id, store, path)
+    return entry is not None and not entry.get('placeholder', False)
+
+# Forget a player once a real photo has been found
+def clear_player(player_id, store, path=recheck_path):
+    records = load_rechecks(path)
+    if records.get(store, {}).pop(str(player_id), None) is not None:
+        save_json(path, records)
+
+def is_flagged(player_id, store, path=recheck_path):
+    return recheck_entry(player_id, store, path) is not None
+
+# Whether a flagged player is due for another look at the CDN
+def recheck_due(player_id, store, path=recheck_path, now=None):
+    entry = recheck_entry(player_id, store, path)
+    if entry is None:
+        return False
+    return pd.Timestamp(now or pd.Timestamp.now()) >= pd.Timestamp(entry['next_check'])
+
+# Player ID at the end of an avatar file name (images/avatars/Name_123.png)
+def player_id_from_path(path):
+    match = re.search(r'_(\d+)\.png$', path)
+    return int(match.group(1)) if match else None
+
+# Fingerprint every avatar in a directory (an image store) in one batch and flag the fallbacks.
+# Hashes shared by several different players are learned as new fallbacks;
+# our own generated placeholders, which look alike, are left out of that
+# count and are never flagged.
+def scan_avatars(directory=avatar_store, table_path=fallback_table_path):
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.png'))
+    hashes, placeholders = dhash_files(paths, with_placeholders=True)
+    player_ids = [player_id_from_path(path) for path in paths]
+
+    table = load_fallback_table(table_path)
+    rechecks = load_rechecks().get(directory, {})
+    replaced = np.array([rechecks.get(str(player_id), {}).get('placeholder', False) for player_id in player_ids],
+                        dtype=bool)
+    downloaded = ~replaced & ~placeholders
+    counts = pd.Series([str(player_id) for player_id in player_ids])[downloaded].groupby(hashes[downloaded]).nunique()
+    for value, players in counts.items():
+        if value != 0 and players >= shared_hash_players:
+            table.setdefault(format(int(value), '016x'), f'shared by {players} players')
+    save_json(table_path, table)
+
+    fallback = match_fallbacks(hashes, table) & ~placeholders
+    for path, player_id, is_fallback in zip(paths, player_ids, fallback):
+        if is_fallback and player_id is not None and not is_flagged(player_id, directory):
+            flag_player(player_id, directory)
+
+    return pd.DataFrame({'AVATAR_PATH': paths, 'PLAYER_ID': player_ids,
+                         'HASH': [format(int(value), '016x') for value in hashes], 'FALLBACK': fallback})
+
+if __name__ == '__main__':
+    print("Fingerprinting player avatars...")
+    results = scan_avatars()
+    print(f"Scanned {len(results)} avatars, {int(results['FALLBACK'].sum())} are fallback headshots")
+    for _, row in results[results['FALLBACK']].iterrows():
+        print(f"  {row['AVATAR_PATH']}")
@@ -0,0 +1,260 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+import process_data
+import finalize_visualization as renderer
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Rendered charts and their computed frames, one directory per (spec, dataset) pair
+cache_dir = 'data/chart_cache'
+
+# Defaults reproduce the original PTS vs FGA chart
+default_spec = {
+    'x': 'FGA',
+    'y': 'PTS',
+    'filters': {'min_games': process_data.min_games, 'teams': None, 'ranges': {}},
+    'split': 'median',
+    'top_n': process_data.top_n,
+    'sort_by': 'PTS',
+    'avatars': True,
+    'highlight': [],
+    'dpi': 150,
+}
+
+# In-process results, so repeated requests skip even the disk read
+result_cache = {}
+
+# Read a spec from a JSON or YAML file
+def load_spec(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError("PyYAML is required for YAML chart specs (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+# Fill in the defaults so equivalent specs hash the same
+def normalize_spec(spec):
+    spec = dict(spec or {})
+    unknown = set(spec) - set(default_spec)
+    if unknown:
+        raise ValueError(f"Unknown chart spec keys: {', '.join(sorted(unknown))}")
+
+    normalized = {**default_spec, **spec}
+    normalized['filters'] = {**default_spec['filters'], **(spec.get('filters') or {})}
+    teams = normalized['filters']['teams']
+    if teams is not None:
+        normalized['filters']['teams'] = sorted(teams)
+    normalized['filters']['ranges'] = {column: list(limits) for column, limits
+                                       in sorted((normalized['filters']['ranges'] or {}).items())}
+    normalized['highlight'] = [int(player_id) for player_id in normalized['highlight'] or []]
+    return normalized
+
+def spec_hash(spec):
+    canonical = json.dumps(normalize_spec(spec), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+# Fingerprint of the whole stats table, so any change to the data invalidates the cache
+def dataset_fingerprint(df):
+    hashed = pd.util.hash_pandas_object(df, index=False)
+    columns = ','.join(map(str, df.columns))
+    return hashlib.sha1(hashed.values.tobytes() + columns.encode()).hexdigest()
+
+# Fingerprint of the avatar files (names, sizes and modification times), so a
+# swapped headshot or placeholder invalidates charts drawn with avatars
+def avatars_fingerprint(directory='images/avatars'):
+    if not os.path.isdir(directory):
+        return 'none'
+    entries = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                     for entry in os.scandir(directory) if entry.is_file())
+    return hashlib.sha1(json.dumps(entries).encode()).hexdigest()
+
+# Cache key of a spec rendered from a dataset, including the avatars when the chart shows them
+def cache_key(spec, fingerprint):
+    if spec['avatars']:
+        fingerprint = hashlib.sha1(f'{fingerprint}:{avatars_fingerprint()}'.encode()).hexdigest()
+    return spec_hash(spec), fingerprint
+
+# Quadrant split values for one axis: median, mean, a percentile (e.g. 'p75') or a fixed number
+def split_value(values, method):
+    if isinstance(method, (int, float)):
+        return float(method)
+    if method == 'median':
+        return float(values.median())
+    if method == 'mean':
+        return float(values.mean())
+    if isinstance(method, str) and method.startswith('p'):
+        return float(np.percentile(values, float(method[1:])))
+    raise ValueError(f"Unknown split method: {method}")
+
+# Label shown in the info panel for a split method
+def split_label(method):
+    if isinstance(method, dict):
+        return 'Split'
+    if isinstance(method, (int, float)):
+        return 'Fixed'
+    if method.startswith('p'):
+        return f'{method[1:]}th percentile'
+    return method.capitalize()
+
+# Apply the spec's filters and ordering to the raw player stats
+def filter_frame(spec, df):
+    filters = spec['filters']
+
+    frame = process_data.filter_players(df, filters['min_games'])
+    if filters['teams'] is not None:
+        frame = frame[frame['TEAM_ABBREVIATION'].isin(filters['teams'])]
+    for column, (low, high) in filters['ranges'].items():
+        if low is not None:
+            frame = frame[frame[column] >= low]
+        if high is not None:
+            frame = frame[frame[column] <= high]
+
+    return frame.sort_values(spec['sort_by'], ascending=False, kind='stable')
+
+# Apply the spec's filters, ordering and top-N to the raw player stats
+def compute_frame(spec, df):
+    spec = normalize_spec(spec)
+    frame = filter_frame(spec, df).head(spec['top_n']).copy()
+    if spec['avatars']:
+        frame = process_data.attach_avatars(frame)
+    return frame.reset_index(drop=True)
+
+# Highlighted players outside the top N. They are drawn on the chart but
+# left out of its bounds and panels, which describe the top N only.
+def compute_highlights(spec, df):
+    spec = normalize_spec(spec)
+    extra = filter_frame(spec, df).iloc[spec['top_n']:]
+    extra = extra[extra['PLAYER_ID'].isin(spec['highlight'])].copy()
+    if spec['avatars'] and not extra.empty:
+        extra = process_data.attach_avatars(extra)
+    return extra.reset_index(drop=True)
+
+# Quadrant split values and axis limits for a computed frame
+def compute_bounds(spec, frame):
+    spec = normalize_spec(spec)
+    x, y, split = spec['x'], spec['y'], spec['split']
+    bounds = renderer.get_chart_bounds(frame, x, y)
+    if isinstance(split, dict):
+        bounds['x_split'] = split_value(frame[x], split.get('x', 'median'))
+        bounds['y_split'] = split_value(frame[y], split.get('y', 'median'))
+    else:
+        bounds['x_split'] = split_value(frame[x], split)
+        bounds['y_split'] = split_value(frame[y], split)
+    return {name: float(value) for name, value in bounds.items()}
+
+def result_dir(key, root=cache_dir):
+    return os.path.join(root, f'{key[0]}-{key[1]}')
+
+# Files of a complete cache entry
+result_files = ['chart.png', 'frame.csv', 'bounds.json', 'spec.json']
+
+# Read a previously rendered result from disk, if it exists
+def load_result(key, root=cache_dir):
+    directory = result_dir(key, root)
+    image_path = os.path.join(directory, 'chart.png')
+    if not all(os.path.exists(os.path.join(directory, name)) for name in result_files):
+        return None
+    with open(os.path.join(directory, 'bounds.json')) as f:
+        bounds = json.load(f)
+    frame = pd.read_csv(os.path.join(directory, 'frame.csv'))
+    return {'frame': frame, 'bounds': bounds, 'image_path': image_path}
+
+# Compute and render a spec, or return the cached result for this (spec, dataset) pair.
+# Pass the fingerprint when rendering many specs against the same table.
+def render_spec(spec, df, fingerprint=None, root=cache_dir, use_cache=True):
+    spec = normalize_spec(spec)
+    fingerprint = fingerprint or dataset_fingerprint(df)
+    key = cache_key(spec, fingerprint)
+
+    if use_cache:
+        if key in result_cache:
+            return result_cache[key]
+        cached = load_result(key, root)
+        if cached is not None:
+            result_cache[key] = cached
+            return cached
+
+    frame = compute_frame(spec, df)
+    if frame.empty:
+        raise ValueError(f"No players match chart spec {key[0]}")
+    bounds = compute_bounds(spec, frame)
+    extra = compute_highlights(spec, df)
+
+    fig = renderer.build_final_figure(frame, highlight_ids=spec['highlight'], x=spec['x'], y=spec['y'],
+                                      bounds=bounds, avatars=spec['avatars'], extra=extra,
+                                      split_label=split_label(spec['split']), top_n=spec['top_n'],
+                                      min_games=spec['filters']['min_games'])
+
+    # Write the entry into a temporary directory and move it into place in one
+    # step, so a crash never leaves a partial entry behind
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=root, prefix='.tmp-')
+    try:
+        fig.savefig(os.path.join(staging, 'chart.png'), dpi=spec['dpi'], bbox_inches='tight')
+        frame.to_csv(os.path.join(staging, 'frame.csv'), index=False)
+        with open(os.path.join(staging, 'bounds.json'), 'w') as f:
+            json.dump(bounds, f, indent=2)
+        with open(os.path.join(staging, 'spec.json'), 'w') as f:
+            json.dump(spec, f, indent=2, sort_keys=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        plt.close(fig)
+
+    # Avatars fetched while computing the frame are part of the key of the finished chart
+    key = cache_key(spec, fingerprint)
+    directory = result_dir(key, root)
+    if load_result(key, root) is None:
+        # Clear any partial entry left by an older version before moving ours in
+        shutil.rmtree(directory, ignore_errors=True)
+        try:
+            os.replace(staging, directory)
+        except OSError:
+            if load_result(key, root) is None:
+                raise
+    # Another worker may have finished the same chart first
+    shutil.rmtree(staging, ignore_errors=True)
+
+    result = {'frame': frame, 'bounds': bounds, 'image_path': os.path.join(directory, 'chart.png')}
+    result_cache[key] = result
+    return result
+
+# Render many specs against one table, fingerprinting the data only once
+def render_specs(specs, df, root=cache_dir, use_cache=True):
+    fingerprint = dataset_fingerprint(df)
+    return [render_spec(spec, df, fingerprint, root, use_cache) for spec in specs]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render quadrant charts from JSON or YAML chart specs.')
+    parser.add_argument('specs', nargs='+', help='Chart spec files')
+    parser.add_argument('--input', default='data/nba_player_stats.csv')
+    parser.add_argument('--no-cache', action='store_true', help='Render even if a cached chart exists')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    fingerprint = dataset_fingerprint(df)
+    print(f"Loaded {len(df)} players (dataset {fingerprint[:12]})")
+
+    for path in args.specs:
+        start = time.perf_counter()
+        result = render_spec(load_spec(path), df, fingerprint, use_cache=not args.no_cache)
+        print(f"{path}: {len(result['frame'])} players -> {result['image_path']} "
+              f"({time.perf_counter() - start:.2f} s)")
@@ -0,0 +1,156 @@
+import json
+import os
+
+import pandas as pd
+
+import process_data
+
+# Stored snapshot of the latest leaguedashplayerstats rows
+snapshot_path = 'data/nba_player_stats.csv'
+
+# Append-only log of changesets, one JSON object per line
+change_log_path = 'data/nba_player_stats_changes.jsonl'
+
+# Rows are matched between snapshots on this column
+key_column = 'PLAYER_ID'
+
+# Columns compared between snapshots. Rank columns are skipped because a
+# single player's change shifts the rank of many others.
+def stat_columns(df):
+    return [column for column in df.columns if column != key_column and not column.endswith('_RANK')]
+
+# Load the stored snapshot, if there is one. Floats are parsed with the
+# round-trip parser so unchanged values compare equal to a fresh payload.
+def load_snapshot(path=snapshot_path):
+    if os.path.exists(path):
+        return pd.read_csv(path, float_precision='round_trip')
+    return None
+
+# Diff a new payload against the stored snapshot by PLAYER_ID and stat columns
+def diff_snapshots(old_df, new_df):
+    if old_df is None or old_df.empty:
+        return {
+            'new': new_df.copy(),
+            'changed': new_df.iloc[0:0].copy(),
+            'removed': new_df.iloc[0:0].copy(),
+            'changed_columns': {},
+        }
+
+    old = old_df.set_index(key_column)
+    new = new_df.set_index(key_column)
+
+    new_ids = new.index.difference(old.index)
+    removed_ids = old.index.difference(new.index)
+    common_ids = new.index.intersection(old.index)
+
+    # Compare the shared stat columns for players present in both snapshots,
+    # treating missing values on both sides as equal
+    columns = [column for column in stat_columns(new_df) if column in old.columns]
+    old_values = old.loc[common_ids, columns]
+    new_values = new.loc[common_ids, columns]
+    differs = (old_values != new_values) & ~(old_values.isna() & new_values.isna())
+    changed_mask = differs.any(axis=1)
+    changed_ids = common_ids[changed_mask.values]
+
+    changed_columns = {
+        player_id: [column for column, value in row.items() if value]
+        for player_id, row in differs[changed_mask].iterrows()
+    }
+
+    return {
+        'new': new.loc[new_ids].reset_index(),
+        'changed': new.loc[changed_ids].reset_index(),
+        'removed': old.loc[removed_ids].reset_index(),
+        'changed_columns': changed_columns,
+    }
+
+# Check whether a changeset has anything in it
+def changeset_is_empty(changeset):
+    return changeset['new'].empty and changeset['changed'].empty and changeset['removed'].empty
+
+# Summarize a changeset for log output
+def describe_changeset(changeset):
+    return (f"{len(changeset['new'])} new, {len(changeset['changed'])} changed, "
+            f"{len(changeset['removed'])} removed players")
+
+# Convert a DataFrame to JSON-safe records
+def frame_records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+# Append a compact changeset to the change log: full rows for new players,
+# only the changed columns for changed players, and IDs for removed players
+def append_change_log(changeset, path=change_log_path, fetched_at=None):
+    changed = []
+    for record in frame_records(changeset['changed']):
+        columns = changeset['changed_columns'].get(record[key_column], [])
+        changed.append({key_column: record[key_column], 'changes': {column: record[column] for column in columns}})
+
+    entry = {
+        'fetched_at': fetched_at or pd.Timestamp.now().isoformat(),
+        'new': frame_records(changeset['new']),
+        'changed': changed,
+        'removed': changeset['removed'][key_column].tolist(),
+    }
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+# Read the change log entries after the first start lines
+def read_change_log(path=change_log_path, start=0):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for i, line in enumerate(f) if i >= start and line.strip()]
+
+# Combine logged changesets into one changeset against the current snapshot:
+# every player named in the entries is taken in its current state, or as
+# removed if it is no longer in the snapshot
+def changeset_from_log(entries, current_df):
+    affected = set()
+    for entry in entries:
+        affected |= {record[key_column] for record in entry['new']}
+        affected |= {record[key_column] for record in entry['changed']}
+        affected |= set(entry['removed'])
+
+    present = current_df[key_column].isin(affected)
+    return {
+        'new': current_df.iloc[0:0].copy(),
+        'changed': current_df[present].reset_index(drop=True),
+        'removed': pd.DataFrame({key_column: sorted(affected - set(current_df[key_column]))}),
+        'changed_columns': {},
+    }
+
+# IDs of every player touched by a changeset
+def affected_player_ids(changeset):
+    return set(changeset['new'][key_column]) | set(changeset['changed'][key_column]) | set(changeset['removed'][key_column])
+
+# Teams whose charts need refreshing: the current teams of new and changed
+# players plus the previous teams of changed and removed players
+def affected_teams(changeset, old_df=None):
+    teams = set(changeset['new'].get('TEAM_ABBREVIATION', [])) | set(changeset['changed'].get('TEAM_ABBREVIATION', []))
+    teams |= set(changeset['removed'].get('TEAM_ABBREVIATION', []))
+    if old_df is not None and not changeset['changed'].empty:
+        previous = old_df[old_df[key_column].isin(changeset['changed'][key_column])]
+        teams |= set(previous['TEAM_ABBREVIATION'])
+    return teams
+
+# Apply a changeset to a stored snapshot
+def apply_changeset(snapshot, changeset):
+    if snapshot is None:
+        return changeset['new'].copy()
+    unchanged = snapshot[~snapshot[key_column].isin(affected_player_ids(changeset))]
+    return pd.concat([unchanged, changeset['changed'], changeset['new']], ignore_index=True)
+
+# Update the processed metrics (GP filter, PTS/FGA, avatars) for the players
+# in a changeset only, leaving every other row untouched
+def update_metrics(metrics_df, changeset, min_games=process_data.min_games, with_avatars=True):
+    updated = pd.concat([changeset['changed'], changeset['new']], ignore_index=True)
+    updated = process_data.filter_players(updated, min_games)
+    if with_avatars and not updated.empty:
+        updated = process_data.attach_avatars(updated)
+
+    if metrics_df is None:
+        return updated.reset_index(drop=True)
+    unchanged = metrics_df[~metrics_df[key_column].isin(affected_player_ids(changeset))]
+    return pd.concat([unchanged, updated], ignore_index=True)
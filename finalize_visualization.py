@@ -10,16 +10,21 @@ import matplotlib.gridspec as gridspec
 # Create output directory
 os.makedirs('output', exist_ok=True)
 
-print("Finalizing four-quadrant chart with enhanced visual elements...")
+# Decoded avatar images keyed by (path, modification time), so long-running
+# processes only decode each thumbnail once
+image_cache = {}
 
-# Load the processed player data
-df = pd.read_csv('data/processed_players_for_visualization.csv')
-print(f"Loaded data for {len(df)} players")
+# Load an avatar image as an array, reusing the decoded copy when the file is unchanged
+def load_image_array(path):
+    key = (path, os.path.getmtime(path))
+    if key not in image_cache:
+        image_cache[key] = plt.imread(path)
+    return image_cache[key]
 
 # Function to load and resize an image for use in the plot
 def get_image(path, zoom=0.15):
     try:
-        img = plt.imread(path)
+        img = load_image_array(path)
         return OffsetImage(img, zoom=zoom)
     except Exception as e:
         print(f"Error loading image {path}: {e}")
@@ -31,152 +36,222 @@ def get_image(path, zoom=0.15):
         fallback[:, :, 3] = 1.0  # Alpha
         return OffsetImage(fallback, zoom=zoom)
 
-# Create a figure with a specific size and DPI for high quality
-plt.figure(figsize=(24, 18), dpi=150)
-
-# Create a grid for the main plot and the efficiency legend
-gs = gridspec.GridSpec(2, 2, height_ratios=[4, 1], width_ratios=[4, 1])
-ax_main = plt.subplot(gs[0, 0])  # Main plot
-ax_eff = plt.subplot(gs[0, 1])   # Efficiency metrics
-ax_info = plt.subplot(gs[1, :])  # Information panel
-
-# Get the quadrant boundaries
-pts_median = df['PTS'].median()
-fga_median = df['FGA'].median()
-
-# Set axis limits with some padding
-pts_max = df['PTS'].max() * 1.05
-pts_min = df['PTS'].min() * 0.95
-fga_max = df['FGA'].max() * 1.05
-fga_min = df['FGA'].min() * 0.95
-
-# Create the quadrant areas with light colors on the main plot
-# Q1: High Points, High Attempts (top right)
-ax_main.add_patch(patches.Rectangle((fga_median, pts_median), fga_max - fga_median, pts_max - pts_median, 
-                              alpha=0.15, facecolor='red', edgecolor='darkred', linewidth=1.5))
-# Q2: High Points, Low Attempts (top left)
-ax_main.add_patch(patches.Rectangle((fga_min, pts_median), fga_median - fga_min, pts_max - pts_median, 
-                              alpha=0.15, facecolor='green', edgecolor='darkgreen', linewidth=1.5))
-# Q3: Low Points, Low Attempts (bottom left)
-ax_main.add_patch(patches.Rectangle((fga_min, pts_min), fga_median - fga_min, pts_median - pts_min, 
-                              alpha=0.15, facecolor='blue', edgecolor='darkblue', linewidth=1.5))
-# Q4: Low Points, High Attempts (bottom right)
-ax_main.add_patch(patches.Rectangle((fga_median, pts_min), fga_max - fga_median, pts_median - pts_min, 
-                              alpha=0.15, facecolor='orange', edgecolor='darkorange', linewidth=1.5))
-
-# Draw the quadrant dividing lines
-ax_main.axhline(y=pts_median, color='black', linestyle='--', alpha=0.7, linewidth=1.5)
-ax_main.axvline(x=fga_median, color='black', linestyle='--', alpha=0.7, linewidth=1.5)
+# Axis labels and (long, short) names for the stats charted by default
+axis_labels = {'FGA': 'Field Goal Attempts (FGA)', 'PTS': 'Points Scored (PTS)'}
+stat_names = {'FGA': ('Field goal attempts', 'field goal attempts'), 'PTS': ('Points scored', 'points')}
+
+# Whether the chart shows the original scoring output vs. shot attempts axes
+def is_scoring_chart(x, y):
+    return (x, y) == ('FGA', 'PTS')
+
+# Get the quadrant boundaries (medians) and axis limits with some padding
+def get_chart_bounds(df, x='FGA', y='PTS'):
+    return {
+        'y_split': df[y].median(),
+        'x_split': df[x].median(),
+        'y_max': df[y].max() * 1.05,
+        'y_min': df[y].min() * 0.95,
+        'x_max': df[x].max() * 1.05,
+        'x_min': df[x].min() * 0.95,
+    }
+
+# Size of the final chart figure in inches
+figure_size = (24, 18)
+
+# Create the chart layout: the main plot, the efficiency legend and the information panel
+def add_chart_axes(fig):
+    gs = gridspec.GridSpec(2, 2, figure=fig, height_ratios=[4, 1], width_ratios=[4, 1])
+    ax_main = fig.add_subplot(gs[0, 0])  # Main plot
+    ax_eff = fig.add_subplot(gs[0, 1])   # Efficiency metrics
+    ax_info = fig.add_subplot(gs[1, :])  # Information panel
+    return ax_main, ax_eff, ax_info
+
+# Draw the static quadrant background: patches, dividing lines and reference lines.
+# Returns the patches and lines, so a kept figure can replace them.
+def draw_quadrant_background(ax_main, bounds, x='FGA', y='PTS'):
+    pts_median, fga_median = bounds['y_split'], bounds['x_split']
+    pts_max, pts_min = bounds['y_max'], bounds['y_min']
+    fga_max, fga_min = bounds['x_max'], bounds['x_min']
+
+    # Create the quadrant areas with light colors on the main plot
+    # Q1: High Points, High Attempts (top right)
+    artists = [ax_main.add_patch(patches.Rectangle((fga_median, pts_median), fga_max - fga_median, pts_max - pts_median,
+                                  alpha=0.15, facecolor='red', edgecolor='darkred', linewidth=1.5))]
+    # Q2: High Points, Low Attempts (top left)
+    artists.append(ax_main.add_patch(patches.Rectangle((fga_min, pts_median), fga_median - fga_min, pts_max - pts_median,
+                                  alpha=0.15, facecolor='green', edgecolor='darkgreen', linewidth=1.5)))
+    # Q3: Low Points, Low Attempts (bottom left)
+    artists.append(ax_main.add_patch(patches.Rectangle((fga_min, pts_min), fga_median - fga_min, pts_median - pts_min,
+                                  alpha=0.15, facecolor='blue', edgecolor='darkblue', linewidth=1.5)))
+    # Q4: Low Points, High Attempts (bottom right)
+    artists.append(ax_main.add_patch(patches.Rectangle((fga_median, pts_min), fga_max - fga_median, pts_median - pts_min,
+                                  alpha=0.15, facecolor='orange', edgecolor='darkorange', linewidth=1.5)))
+
+    # Draw the quadrant dividing lines
+    artists.append(ax_main.axhline(y=pts_median, color='black', linestyle='--', alpha=0.7, linewidth=1.5))
+    artists.append(ax_main.axvline(x=fga_median, color='black', linestyle='--', alpha=0.7, linewidth=1.5))
+
+    # Set axis labels and title for main plot
+    ax_main.set_xlabel(axis_labels.get(x, x), fontsize=16, weight='bold')
+    ax_main.set_ylabel(axis_labels.get(y, y), fontsize=16, weight='bold')
+    if is_scoring_chart(x, y):
+        ax_main.set_title('NBA Players: Scoring Output vs. Shot Attempts', fontsize=22, weight='bold')
+    else:
+        ax_main.set_title(f'NBA Players: {y} vs. {x}', fontsize=22, weight='bold')
+
+    # Add grid lines for better readability
+    ax_main.grid(True, linestyle=':', alpha=0.3)
+
+    # The efficiency reference lines only make sense on the scoring chart
+    if not is_scoring_chart(x, y):
+        return artists
+
+    # Add a diagonal reference line for points per field goal attempt = 1.0, 1.5, and 2.0
+    x_ref = np.linspace(fga_min, fga_max, 100)
+    for ratio, style, width, label in zip([1.0, 1.5, 2.0], ['-', '--', ':'], [2, 2, 2],
+                                         ['1.0 PTS/FGA', '1.5 PTS/FGA', '2.0 PTS/FGA']):
+        y_ref = x_ref * ratio
+        artists += ax_main.plot(x_ref, y_ref, linestyle=style, color='black', alpha=0.5,
+                 linewidth=width, label=label)
+
+    # Add legend to main plot
+    ax_main.legend(loc='lower right', fontsize=12, framealpha=0.8)
+    return artists
+
+# Add quadrant labels with enhanced styling. They are drawn after the avatars
+# so that no avatar covers them.
+def draw_quadrant_labels(ax_main, bounds, x='FGA', y='PTS'):
+    pts_max, pts_min = bounds['y_max'], bounds['y_min']
+    fga_max, fga_min = bounds['x_max'], bounds['x_min']
+
+    # Quadrant names: top right, top left, bottom left, bottom right
+    if is_scoring_chart(x, y):
+        quadrant_names = ["High Volume Scorers", "Efficient Scorers", "Low Usage Players", "Volume Shooters"]
+    else:
+        quadrant_names = [f"High {y}, High {x}", f"High {y}, Low {x}", f"Low {y}, Low {x}", f"Low {y}, High {x}"]
+
+    return [
+        ax_main.text(fga_max*0.95, pts_max*0.95, quadrant_names[0],
+                 ha='right', va='top', fontsize=16, weight='bold', color='darkred',
+                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkred', boxstyle='round,pad=0.5')),
+        ax_main.text(fga_min*1.05, pts_max*0.95, quadrant_names[1],
+                 ha='left', va='top', fontsize=16, weight='bold', color='darkgreen',
+                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkgreen', boxstyle='round,pad=0.5')),
+        ax_main.text(fga_min*1.05, pts_min*1.05, quadrant_names[2],
+                 ha='left', va='bottom', fontsize=16, weight='bold', color='darkblue',
+                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkblue', boxstyle='round,pad=0.5')),
+        ax_main.text(fga_max*0.95, pts_min*1.05, quadrant_names[3],
+                 ha='right', va='bottom', fontsize=16, weight='bold', color='darkorange',
+                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkorange', boxstyle='round,pad=0.5')),
+    ]
+
+# Draw a player's avatar with their name and team below it
+def draw_avatar_marker(ax_main, player, x='FGA', y='PTS'):
+    img = get_image(player['AVATAR_PATH'])
+
+    # Create an annotation box for the avatar
+    ab = AnnotationBbox(img, (player[x], player[y]),
+                       frameon=True,
+                       pad=0.2,
+                       bboxprops=dict(boxstyle="round,pad=0.3",
+                                     fc="white",
+                                     ec="black",
+                                     lw=1.5))
+    artists = [ax_main.add_artist(ab)]
+
+    # Add player name below the avatar
+    artists.append(ax_main.annotate(player['PLAYER_NAME'],
+                (player[x], player[y]),
+                xytext=(0, -30),
+                textcoords='offset points',
+                ha='center',
+                fontsize=9,
+                weight='bold'))
+
+    # Add team abbreviation
+    artists.append(ax_main.annotate(player['TEAM_ABBREVIATION'],
+                (player[x], player[y]),
+                xytext=(0, -42),
+                textcoords='offset points',
+                ha='center',
+                fontsize=8))
+    return artists
+
+# Add points per game and efficiency below a player's avatar marker
+def draw_stat_line(ax_main, player, x='FGA', y='PTS'):
+    pts_per_game = player['PTS'] / player['GP']
+    efficiency = player['PTS_per_FGA']
+    return ax_main.annotate(f"{pts_per_game:.1f} PPG | {efficiency:.2f} PTS/FGA",
+                (player[x], player[y]),
+                xytext=(0, -54),
+                textcoords='offset points',
+                ha='center',
+                fontsize=8)
 
 # Add player avatars to the chart
-for idx, player in df.iterrows():
-    # Get player avatar
-    if 'AVATAR_PATH' in player and os.path.exists(player['AVATAR_PATH']):
-        img = get_image(player['AVATAR_PATH'])
-        
-        # Create an annotation box for the avatar
-        ab = AnnotationBbox(img, (player['FGA'], player['PTS']),
-                           frameon=True,
-                           pad=0.2,
-                           bboxprops=dict(boxstyle="round,pad=0.3", 
-                                         fc="white", 
-                                         ec="black", 
-                                         lw=1.5))
-        ax_main.add_artist(ab)
-        
-        # Add player name below the avatar
-        ax_main.annotate(player['PLAYER_NAME'], 
-                    (player['FGA'], player['PTS']),
-                    xytext=(0, -30),
-                    textcoords='offset points',
-                    ha='center',
-                    fontsize=9,
-                    weight='bold')
-        
-        # Add team abbreviation
-        ax_main.annotate(player['TEAM_ABBREVIATION'], 
-                    (player['FGA'], player['PTS']),
-                    xytext=(0, -42),
-                    textcoords='offset points',
-                    ha='center',
-                    fontsize=8)
-        
-        # Add points per game and efficiency
-        pts_per_game = player['PTS'] / player['GP']
-        efficiency = player['PTS_per_FGA']
-        ax_main.annotate(f"{pts_per_game:.1f} PPG | {efficiency:.2f} PTS/FGA", 
-                    (player['FGA'], player['PTS']),
-                    xytext=(0, -54),
-                    textcoords='offset points',
-                    ha='center',
-                    fontsize=8)
-    else:
-        # Fallback if avatar not available
-        ax_main.scatter(player['FGA'], player['PTS'], alpha=0.7, s=100)
-        ax_main.annotate(f"{player['PLAYER_NAME']} ({player['TEAM_ABBREVIATION']})", 
-                    (player['FGA'], player['PTS']),
-                    xytext=(5, 5),
-                    textcoords='offset points',
-                    fontsize=8)
-
-# Add quadrant labels with enhanced styling
-ax_main.text(fga_max*0.95, pts_max*0.95, "High Volume Scorers", 
-         ha='right', va='top', fontsize=16, weight='bold', color='darkred',
-         bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkred', boxstyle='round,pad=0.5'))
-
-ax_main.text(fga_min*1.05, pts_max*0.95, "Efficient Scorers", 
-         ha='left', va='top', fontsize=16, weight='bold', color='darkgreen',
-         bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkgreen', boxstyle='round,pad=0.5'))
-
-ax_main.text(fga_min*1.05, pts_min*1.05, "Low Usage Players", 
-         ha='left', va='bottom', fontsize=16, weight='bold', color='darkblue',
-         bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkblue', boxstyle='round,pad=0.5'))
-
-ax_main.text(fga_max*0.95, pts_min*1.05, "Volume Shooters", 
-         ha='right', va='bottom', fontsize=16, weight='bold', color='darkorange',
-         bbox=dict(facecolor='white', alpha=0.7, edgecolor='darkorange', boxstyle='round,pad=0.5'))
-
-# Set axis labels and title for main plot
-ax_main.set_xlabel('Field Goal Attempts (FGA)', fontsize=16, weight='bold')
-ax_main.set_ylabel('Points Scored (PTS)', fontsize=16, weight='bold')
-ax_main.set_title('NBA Players: Scoring Output vs. Shot Attempts', fontsize=22, weight='bold')
-
-# Add grid lines for better readability
-ax_main.grid(True, linestyle=':', alpha=0.3)
-
-# Add a diagonal reference line for points per field goal attempt = 1.0, 1.5, and 2.0
-x_ref = np.linspace(fga_min, fga_max, 100)
-for ratio, style, width, label in zip([1.0, 1.5, 2.0], ['-', '--', ':'], [2, 2, 2], 
-                                     ['1.0 PTS/FGA', '1.5 PTS/FGA', '2.0 PTS/FGA']):
-    y_ref = x_ref * ratio
-    ax_main.plot(x_ref, y_ref, linestyle=style, color='black', alpha=0.5, 
-             linewidth=width, label=label)
-
-# Add legend to main plot
-ax_main.legend(loc='lower right', fontsize=12, framealpha=0.8)
+def draw_player_avatars(ax_main, df, x='FGA', y='PTS', avatars=True):
+    artists = []
+    for idx, player in df.iterrows():
+        # Get player avatar
+        if avatars and 'AVATAR_PATH' in player and os.path.exists(player['AVATAR_PATH']):
+            artists += draw_avatar_marker(ax_main, player, x, y)
+            artists.append(draw_stat_line(ax_main, player, x, y))
+        else:
+            # Fallback if avatar not available
+            artists.append(ax_main.scatter(player[x], player[y], alpha=0.7, s=100))
+            artists.append(ax_main.annotate(f"{player['PLAYER_NAME']} ({player['TEAM_ABBREVIATION']})",
+                        (player[x], player[y]),
+                        xytext=(5, 5),
+                        textcoords='offset points',
+                        fontsize=8))
+    return artists
+
+# Circle highlighted players, e.g. a player and their most similar peers;
+# the first ID is drawn in a different color from the rest
+def draw_highlights(ax_main, df, highlight_ids, x='FGA', y='PTS'):
+    for i, player_id in enumerate(highlight_ids):
+        player = df[df['PLAYER_ID'] == player_id]
+        if player.empty:
+            continue
+        color = 'crimson' if i == 0 else 'magenta'
+        ax_main.scatter(player[x], player[y], s=4000, facecolors='none',
+                        edgecolors=color, linewidths=3, zorder=5)
 
 # Create efficiency metrics panel
-ax_eff.axis('off')  # Turn off axis
-ax_eff.set_title('Scoring Efficiency Leaders', fontsize=16, weight='bold')
-
-# Get top 10 players by efficiency (PTS/FGA)
-top_efficient = df.sort_values('PTS_per_FGA', ascending=False).head(10)
+def draw_efficiency_panel(ax_eff, df, rank_index=None):
+    ax_eff.axis('off')  # Turn off axis
+    ax_eff.set_title('Scoring Efficiency Leaders', fontsize=16, weight='bold')
+
+    # Get top 10 players by efficiency (PTS/FGA). A rank index built once per
+    # snapshot (as the refresh daemon keeps) answers this without sorting;
+    # a single chart just sorts its own players.
+    if rank_index is None:
+        top_efficient = df.sort_values('PTS_per_FGA', ascending=False).head(10)
+    else:
+        top_efficient = rank_index.top_k('PTS_per_FGA', 10, player_ids=df['PLAYER_ID'])
 
-# Create a table of top efficient players
-efficiency_text = "Top 10 by PTS/FGA:\n\n"
-for i, (_, player) in enumerate(top_efficient.iterrows(), 1):
-    efficiency_text += f"{i}. {player['PLAYER_NAME']} ({player['TEAM_ABBREVIATION']})\n"
-    efficiency_text += f"   {player['PTS_per_FGA']:.2f} PTS/FGA\n"
-    efficiency_text += f"   {player['PTS']} PTS / {player['FGA']} FGA\n\n"
+    # Create a table of top efficient players
+    efficiency_text = "Top 10 by PTS/FGA:\n\n"
+    for i, (_, player) in enumerate(top_efficient.iterrows(), 1):
+        efficiency_text += f"{i}. {player['PLAYER_NAME']} ({player['TEAM_ABBREVIATION']})\n"
+        efficiency_text += f"   {player['PTS_per_FGA']:.2f} PTS/FGA\n"
+        # Advanced stats are only present when fetched with scrape_nba_stats.py --advanced
+        if 'TS_PCT' in player and 'USG_PCT' in player:
+            efficiency_text += f"   {player['TS_PCT']:.1%} TS | {player['USG_PCT']:.1%} USG\n"
+        efficiency_text += f"   {player['PTS']} PTS / {player['FGA']} FGA\n\n"
 
-ax_eff.text(0.05, 0.95, efficiency_text, va='top', fontsize=12, 
-           bbox=dict(facecolor='lightgray', alpha=0.3, boxstyle='round,pad=1.0'))
+    return [ax_eff.text(0.05, 0.95, efficiency_text, va='top', fontsize=12,
+               bbox=dict(facecolor='lightgray', alpha=0.3, boxstyle='round,pad=1.0'))]
 
 # Create information panel
-ax_info.axis('off')  # Turn off axis
-
-# Add explanatory text
-quadrant_info = """
+def draw_info_panel(ax_info, df, bounds, x='FGA', y='PTS', split_label='Median', top_n=50, min_games=20):
+    ax_info.axis('off')  # Turn off axis
+    x_long, x_short = stat_names.get(x, (x, x))
+    y_long, y_short = stat_names.get(y, (y, y))
+
+    # Add explanatory text
+    if is_scoring_chart(x, y):
+        quadrant_info = """
 Quadrant Analysis:
 • Top Right (Red): High Volume Scorers - Players who score a lot of points but also take many shot attempts
 • Top Left (Green): Efficient Scorers - Players who score a lot of points with relatively fewer shot attempts
@@ -186,49 +261,94 @@ Quadrant Analysis:
 Diagonal Lines:
 The diagonal reference lines show points per field goal attempt (PTS/FGA) ratios.
 Higher values indicate more efficient scoring (more points per shot attempt).
+"""
+    else:
+        quadrant_info = f"""
+Quadrant Analysis:
+• Top Right (Red): High {y} and high {x}
+• Top Left (Green): High {y} and low {x}
+• Bottom Left (Blue): Low {y} and low {x}
+• Bottom Right (Orange): Low {y} and high {x}
 """
 
-methodology = """
+    methodology = f"""
 Methodology:
 • Data source: NBA.com/stats API
-• Players included: Top 50 NBA players by total points scored in the 2024-25 regular season
-• Minimum games played: 20
-• Quadrant boundaries: Median values for points scored and field goal attempts
+• Players included: Top {top_n} NBA players by total points scored in the 2024-25 regular season
+• Minimum games played: {min_games}
+• Quadrant boundaries: {split_label} values for {y_long.lower()} and {x_long.lower()}
 • Efficiency metric: Points per Field Goal Attempt (PTS/FGA)
 """
 
-data_info = f"""
+    data_info = f"""
 Data Summary:
 • Total players analyzed: {len(df)}
-• Points scored range: {df['PTS'].min():.0f} to {df['PTS'].max():.0f}
-• Field goal attempts range: {df['FGA'].min():.0f} to {df['FGA'].max():.0f}
-• Median points: {pts_median:.0f}
-• Median field goal attempts: {fga_median:.0f}
+• {y_long} range: {df[y].min():.0f} to {df[y].max():.0f}
+• {x_long} range: {df[x].min():.0f} to {df[x].max():.0f}
+• {split_label} {y_short}: {bounds['y_split']:.0f}
+• {split_label} {x_short}: {bounds['x_split']:.0f}
 • Date created: {pd.Timestamp.now().strftime('%Y-%m-%d')}
 """
 
-# Add the text to the information panel
-ax_info.text(0.01, 0.99, quadrant_info, va='top', fontsize=12, transform=ax_info.transAxes)
-ax_info.text(0.34, 0.99, methodology, va='top', fontsize=12, transform=ax_info.transAxes)
-ax_info.text(0.67, 0.99, data_info, va='top', fontsize=12, transform=ax_info.transAxes)
+    # Add the text to the information panel
+    return [
+        ax_info.text(0.01, 0.99, quadrant_info, va='top', fontsize=12, transform=ax_info.transAxes),
+        ax_info.text(0.34, 0.99, methodology, va='top', fontsize=12, transform=ax_info.transAxes),
+        ax_info.text(0.67, 0.99, data_info, va='top', fontsize=12, transform=ax_info.transAxes),
+    ]
 
 # Add a footer with attribution
-plt.figtext(0.5, 0.01, "Created with NBA Stats API data | © 2025", 
-           ha='center', fontsize=10, style='italic')
+def draw_footer(fig):
+    fig.text(0.5, 0.01, "Created with NBA Stats API data | © 2025",
+               ha='center', fontsize=10, style='italic')
 
 # Adjust layout
-plt.tight_layout()
-plt.subplots_adjust(hspace=0.1, wspace=0.1)
-
-# Save the final chart with all enhancements
-plt.savefig('output/nba_scoring_efficiency_quadrant_chart_final.png', dpi=300, bbox_inches='tight')
-print("Final enhanced four-quadrant chart saved to output/nba_scoring_efficiency_quadrant_chart_final.png")
-
-# Create a smaller version for preview
-plt.savefig('output/nba_scoring_efficiency_quadrant_chart_preview.jpg', dpi=150, bbox_inches='tight', format='jpg')
-print("Preview version saved to output/nba_scoring_efficiency_quadrant_chart_preview.jpg")
-
-# Close the figure to free memory
-plt.close()
-
-print("Visualization finalized with enhanced labels and visual elements.")
+def adjust_layout(fig):
+    fig.tight_layout()
+    fig.subplots_adjust(hspace=0.1, wspace=0.1)
+
+# Build the complete final chart figure for the given players. The defaults
+# draw the original PTS vs. FGA chart; chart_spec.py passes other axes,
+# precomputed quadrant bounds and labels, and extra players (highlighted
+# players outside the top N) that are drawn but left out of the panels.
+def build_final_figure(df, rank_index=None, highlight_ids=None, x='FGA', y='PTS', bounds=None,
+                       avatars=True, split_label='Median', top_n=50, min_games=20, extra=None):
+    # Create a figure with a specific size and DPI for high quality
+    fig = plt.figure(figsize=figure_size, dpi=150)
+    ax_main, ax_eff, ax_info = add_chart_axes(fig)
+
+    bounds = bounds or get_chart_bounds(df, x, y)
+    draw_quadrant_background(ax_main, bounds, x, y)
+    drawn = df if extra is None or extra.empty else pd.concat([df, extra], ignore_index=True)
+    draw_player_avatars(ax_main, drawn, x, y, avatars)
+    draw_quadrant_labels(ax_main, bounds, x, y)
+    if highlight_ids:
+        draw_highlights(ax_main, drawn, highlight_ids, x, y)
+    draw_efficiency_panel(ax_eff, df, rank_index)
+    draw_info_panel(ax_info, df, bounds, x, y, split_label, top_n, min_games)
+
+    draw_footer(fig)
+    adjust_layout(fig)
+    return fig
+
+if __name__ == '__main__':
+    print("Finalizing four-quadrant chart with enhanced visual elements...")
+
+    # Load the processed player data
+    df = pd.read_csv('data/processed_players_for_visualization.csv')
+    print(f"Loaded data for {len(df)} players")
+
+    fig = build_final_figure(df)
+
+    # Save the final chart with all enhancements
+    fig.savefig('output/nba_scoring_efficiency_quadrant_chart_final.png', dpi=300, bbox_inches='tight')
+    print("Final enhanced four-quadrant chart saved to output/nba_scoring_efficiency_quadrant_chart_final.png")
+
+    # Create a smaller version for preview
+    fig.savefig('output/nba_scoring_efficiency_quadrant_chart_preview.jpg', dpi=150, bbox_inches='tight', format='jpg')
+    print("Preview version saved to output/nba_scoring_efficiency_quadrant_chart_preview.jpg")
+
+    # Close the figure to free memory
+    plt.close(fig)
+
+    print("Visualization finalized with enhanced labels and visual elements.")
@@ -0,0 +1,167 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+import process_data
+
+# Cached feature matrices, keyed by a fingerprint of the input stats
+cache_dir = 'data/similarity'
+
+# Counting stats, normalized per game (or per 100 possessions when pace is known)
+counting_columns = ['PTS', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA',
+                    'OREB', 'DREB', 'REB', 'AST', 'TOV', 'STL', 'BLK', 'PF']
+
+# Rate stats used as they are
+rate_columns = ['FG_PCT', 'FG3_PCT', 'FT_PCT', 'TS_PCT', 'USG_PCT', 'AST_PCT', 'REB_PCT']
+
+# Candidates scored per batch, which bounds memory for large player-season tables
+batch_size = 8192
+
+# Build per-game (or per-100-possession) stat vectors, standardized per column
+def build_features(df):
+    features = {}
+    for column in counting_columns:
+        if column not in df.columns:
+            continue
+        if 'PACE' in df.columns and 'MIN' in df.columns:
+            # Possessions played: minutes share of a 48 minute game times team pace
+            possessions = df['MIN'] / 48 * df['PACE']
+            features[column] = df[column] / possessions.replace(0, np.nan) * 100
+        else:
+            features[column] = df[column] / df['GP'].replace(0, np.nan)
+    for column in rate_columns:
+        if column in df.columns:
+            features[column] = df[column]
+
+    matrix = pd.DataFrame(features).to_numpy(dtype=np.float32)
+    mean = np.nanmean(matrix, axis=0)
+    std = np.nanstd(matrix, axis=0)
+    std[std == 0] = 1
+    matrix = np.nan_to_num((matrix - mean) / std)
+    return matrix.astype(np.float32), list(features)
+
+# Fingerprint of the rows and columns the features are built from
+def dataset_fingerprint(df):
+    columns = [column for column in ['PLAYER_ID', 'SEASON', 'GP', 'MIN', 'PACE'] + counting_columns + rate_columns
+               if column in df.columns]
+    hashed = pd.util.hash_pandas_object(df[columns], index=False)
+    return hashlib.sha1(hashed.values.tobytes()).hexdigest()
+
+# Nearest-neighbor index over standardized stat vectors. Queries are scored
+# against every player-season with batched matrix products, which handles
+# tens of thousands of rows in milliseconds without a tree structure.
+class SimilarityIndex:
+    def __init__(self, df, matrix, feature_names):
+        self.frame = df.reset_index(drop=True)
+        self.matrix = matrix
+        self.feature_names = feature_names
+        self.squared_norms = np.einsum('ij,ij->i', matrix, matrix)
+
+    @classmethod
+    def build(cls, df, use_cache=True, cache_dir=cache_dir):
+        path = os.path.join(cache_dir, f'{dataset_fingerprint(df)}.npz')
+        if use_cache and os.path.exists(path):
+            with np.load(path) as data:
+                return cls(df, data['matrix'], [str(name) for name in data['features']])
+
+        matrix, feature_names = build_features(df)
+        if use_cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(path, matrix=matrix, features=np.array(feature_names, dtype=str))
+        return cls(df, matrix, feature_names)
+
+    # Row positions of a player, optionally limited to one season
+    def rows_for(self, player_id, season=None):
+        mask = self.frame['PLAYER_ID'] == player_id
+        if season is not None and 'SEASON' in self.frame.columns:
+            mask &= self.frame['SEASON'] == season
+        return np.flatnonzero(mask.to_numpy())
+
+    # Distances and positions of the k nearest rows for each query vector
+    def query_vectors(self, queries, k=5, exclude=None):
+        queries = np.atleast_2d(queries).astype(np.float32)
+        query_norms = np.einsum('ij,ij->i', queries, queries)
+        k = min(k, len(self.matrix))
+
+        best_distances = np.full((len(queries), 0), np.inf, dtype=np.float32)
+        best_positions = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self.matrix), batch_size):
+            block = self.matrix[start:start + batch_size]
+            # Squared Euclidean distance: |q|^2 - 2 q.x + |x|^2
+            distances = query_norms[:, None] - 2 * queries @ block.T + self.squared_norms[start:start + batch_size]
+            if exclude is not None:
+                for i, positions in enumerate(exclude):
+                    inside = positions[(positions >= start) & (positions < start + len(block))]
+                    distances[i, inside - start] = np.inf
+
+            positions = np.broadcast_to(np.arange(start, start + len(block)), distances.shape)
+            best_distances = np.concatenate([best_distances, distances], axis=1)
+            best_positions = np.concatenate([best_positions, positions], axis=1)
+
+            # Keep only the running k best per query
+            keep = np.argpartition(best_distances, min(k, best_distances.shape[1] - 1), axis=1)[:, :k]
+            best_distances = np.take_along_axis(best_distances, keep, axis=1)
+            best_positions = np.take_along_axis(best_positions, keep, axis=1)
+
+        order = np.argsort(best_distances, axis=1)
+        best_distances = np.sqrt(np.maximum(np.take_along_axis(best_distances, order, axis=1), 0))
+        return best_distances, np.take_along_axis(best_positions, order, axis=1)
+
+    # The k players most similar to a player (excluding the player's own rows)
+    def nearest(self, player_id, k=5, season=None):
+        rows = self.rows_for(player_id, season)
+        if len(rows) == 0:
+            raise KeyError(f"No player with PLAYER_ID {player_id}")
+
+        own_rows = self.rows_for(player_id)
+        distances, positions = self.query_vectors(self.matrix[rows[-1]], k, exclude=[own_rows])
+        neighbors = self.frame.iloc[positions[0]].copy()
+        neighbors['DISTANCE'] = distances[0]
+        return neighbors[np.isfinite(neighbors['DISTANCE'])]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the players statistically closest to a given player.')
+    parser.add_argument('player', help='Player name or PLAYER_ID')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--input', default='data/nba_player_stats.csv')
+    parser.add_argument('--chart', action='store_true',
+                        help='Highlight the player and their neighbors on the quadrant chart')
+    args = parser.parse_args()
+
+    df = process_data.filter_players(pd.read_csv(args.input))
+    if args.player.isdigit():
+        player_id = int(args.player)
+    else:
+        matches = df[df['PLAYER_NAME'].str.lower() == args.player.lower()]
+        if matches.empty:
+            raise SystemExit(f"No player named {args.player} with at least {process_data.min_games} games")
+        player_id = int(matches['PLAYER_ID'].iloc[0])
+
+    index = SimilarityIndex.build(df)
+    neighbors = index.nearest(player_id, args.k)
+    player_name = df.loc[df['PLAYER_ID'] == player_id, 'PLAYER_NAME'].iloc[0]
+
+    print(f"Players most similar to {player_name}:")
+    print(neighbors[['PLAYER_NAME', 'TEAM_ABBREVIATION', 'GP', 'PTS', 'FGA', 'DISTANCE']].to_string(index=False))
+
+    if args.chart:
+        import finalize_visualization as renderer
+
+        # Draw the chart for the usual top players plus the query player and their neighbors
+        highlight_ids = [player_id] + neighbors['PLAYER_ID'].tolist()
+        chart_df = pd.read_csv('data/processed_players_for_visualization.csv')
+        extra = df[df['PLAYER_ID'].isin(highlight_ids) & ~df['PLAYER_ID'].isin(chart_df['PLAYER_ID'])]
+        chart_df = pd.concat([chart_df, process_data.attach_avatars(extra.copy())], ignore_index=True)
+
+        fig = renderer.build_final_figure(chart_df, highlight_ids=highlight_ids)
+        output_path = f'output/nba_similar_players_{player_id}.png'
+        fig.savefig(output_path, dpi=150, bbox_inches='tight')
+        plt.close(fig)
+        print(f"Chart with highlighted players saved to {output_path}")
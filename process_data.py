@@ -1,3 +1,5 @@
+import argparse
+import json
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -8,49 +10,85 @@ import requests
 from io import BytesIO
 import time
 
+import avatar_fingerprint
+
 # Create output directory
 os.makedirs('output', exist_ok=True)
 
-print("Processing NBA player statistics for visualization...")
+# Filter players with minimum games played to ensure meaningful data
+min_games = 20
 
-# Load the player statistics data
-df = pd.read_csv('data/nba_player_stats.csv')
+# Number of players selected for visualization
+top_n = 50
 
-# Display basic information about the dataset
-print(f"Total number of players: {len(df)}")
-print(f"Columns in the dataset: {', '.join(df.columns)}")
+# League-wide metrics kept between --incremental runs, and how many change
+# log entries they already include
+metrics_path = 'data/player_metrics.csv'
+metrics_state_path = 'data/player_metrics_state.json'
 
-# Filter players with minimum games played to ensure meaningful data
-min_games = 20
-filtered_df = df[df['GP'] >= min_games].copy()
-print(f"Players with at least {min_games} games played: {len(filtered_df)}")
+# Filter players and calculate points per field goal attempt (scoring efficiency)
+def filter_players(df, min_games=min_games):
+    filtered_df = df[df['GP'] >= min_games].copy()
+    filtered_df['PTS_per_FGA'] = filtered_df['PTS'] / filtered_df['FGA']
+    filtered_df['PTS_per_FGA'] = filtered_df['PTS_per_FGA'].replace([np.inf, -np.inf], np.nan)
+    return filtered_df.dropna(subset=['PTS_per_FGA'])
+
+# Select the top players by total points (stable, so ties keep file order)
+def select_top_players(filtered_df, top_n=top_n):
+    return filtered_df.sort_values('PTS', ascending=False, kind='stable').head(top_n).copy()
 
-# Calculate points per field goal attempt (scoring efficiency)
-filtered_df['PTS_per_FGA'] = filtered_df['PTS'] / filtered_df['FGA']
-filtered_df['PTS_per_FGA'] = filtered_df['PTS_per_FGA'].replace([np.inf, -np.inf], np.nan)
-filtered_df = filtered_df.dropna(subset=['PTS_per_FGA'])
+# Rows read per chunk in chunked mode
+chunk_size = 100_000
 
-# Sort by total points
-filtered_df = filtered_df.sort_values('PTS', ascending=False)
+# Narrow dtypes for the only columns the chunked mode reads
+chunk_dtypes = {
+    'PLAYER_ID': 'int32',
+    'PLAYER_NAME': 'object',
+    'TEAM_ABBREVIATION': 'category',
+    'GP': 'int32',
+    'PTS': 'float32',
+    'FGA': 'float32',
+}
 
-# Select top 50 players by points for visualization
-top_players = filtered_df.head(50)
-print(f"Selected top {len(top_players)} players by points for visualization")
+# Select the top players by total points reading the CSV in fixed-size chunks.
+# Only one chunk and the running top N rows are held in memory, and since the
+# quadrant medians are taken over the top N players they stay exact. The first
+# pass ranks rows on the narrow columns; a second pass re-reads every column
+# of the selected rows, so the output is the same as in the in-memory mode.
+def select_top_players_chunked(path, chunk_size=chunk_size, min_games=min_games, top_n=top_n):
+    top_players = None
+    total_count = 0
+    filtered_count = 0
 
-# Display the top 10 players and their stats
-print("\nTop 10 players by points:")
-print(top_players[['PLAYER_NAME', 'TEAM_ABBREVIATION', 'GP', 'PTS', 'FGA', 'PTS_per_FGA']].head(10))
+    for chunk in pd.read_csv(path, usecols=list(chunk_dtypes), dtype=chunk_dtypes, chunksize=chunk_size):
+        total_count += len(chunk)
 
-# Calculate quartiles for PTS and FGA to determine quadrant boundaries
-pts_median = top_players['PTS'].median()
-fga_median = top_players['FGA'].median()
+        # Same filter as filter_players: minimum games and a finite PTS/FGA
+        chunk = chunk[(chunk['GP'] >= min_games) & (chunk['FGA'] > 0) & chunk['PTS'].notna()]
+        filtered_count += len(chunk)
 
-print(f"\nMedian values for quadrant boundaries:")
-print(f"Points (PTS) median: {pts_median}")
-print(f"Field Goal Attempts (FGA) median: {fga_median}")
+        # Keep a running top N across chunks; the index is the row number in the file
+        candidates = chunk.nlargest(top_n, 'PTS')
+        if top_players is None:
+            top_players = candidates
+        else:
+            top_players = pd.concat([top_players, candidates]).nlargest(top_n, 'PTS')
+
+    if top_players is None:
+        return filter_players(pd.read_csv(path, nrows=0)), total_count, filtered_count
+
+    # Second pass: the full rows of the selected row numbers, in ranking order
+    rows = [chunk[chunk.index.isin(top_players.index)] for chunk in pd.read_csv(path, chunksize=chunk_size)]
+    full_rows = pd.concat(rows).loc[top_players.index]
+
+    return filter_players(full_rows, min_games), total_count, filtered_count
+
+# Calculate medians for PTS and FGA to determine quadrant boundaries
+def get_quadrant_thresholds(top_players):
+    return top_players['PTS'].median(), top_players['FGA'].median()
 
 # Create a function to determine the quadrant for each player
-def get_quadrant(row):
+def get_quadrant(row, pts_median, fga_median):
     if row['PTS'] >= pts_median and row['FGA'] >= fga_median:
         return "High Points, High Attempts"
     elif row['PTS'] >= pts_median and row['FGA'] < fga_median:
@@ -61,75 +99,192 @@ def get_quadrant(row):
         return "Low Points, Low Attempts"
 
 # Add quadrant information to the dataframe
-top_players['Quadrant'] = top_players.apply(get_quadrant, axis=1)
-
-# Count players in each quadrant
-quadrant_counts = top_players['Quadrant'].value_counts()
-print("\nPlayers in each quadrant:")
-print(quadrant_counts)
+def assign_quadrants(top_players, pts_median, fga_median):
+    top_players['Quadrant'] = top_players.apply(get_quadrant, axis=1, args=(pts_median, fga_median))
+    return top_players
 
 # Create a function to generate placeholder avatars for players
 def create_placeholder_avatar(player_name, team_abbr, size=(100, 100)):
     # Create a blank image with a team color background
     img = Image.new('RGB', size, color=(200, 200, 200))
     draw = ImageDraw.Draw(img)
-    
+
     # Add player initials
     initials = ''.join([name[0] for name in player_name.split() if name[0].isupper()])
     if not initials:
         initials = player_name[:2].upper()
-    
+
     # Draw the initials in the center
     draw.text((size[0]//2, size[1]//2), initials, fill=(0, 0, 0))
-    
+
     # Add team abbreviation at the bottom
     draw.text((size[0]//2, size[1]-15), team_abbr, fill=(0, 0, 0))
-    
+
+    # Mark it as generated so avatar_fingerprint.py never mistakes it for a CDN image
+    img.info['Source'] = avatar_fingerprint.placeholder_source
     return img
 
 # Try to get NBA player headshots from NBA.com using a different approach
 def get_player_avatar(player_id, player_name, team_abbr):
     # NBA.com headshot URL format
     url = f"https://ak-static.cms.nba.com/wp-content/uploads/headshots/nba/latest/260x190/{player_id}.png"
-    
+
     try:
         response = requests.get(url)
         if response.status_code == 200:
-            return Image.open(BytesIO(response.content))
+            img = Image.open(BytesIO(response.content))
+            # The CDN answers 200 with a generic silhouette when it has no photo
+            if avatar_fingerprint.is_fallback_image(img):
+                print(f"Only a fallback headshot for {player_name}, creating placeholder")
+                avatar_fingerprint.flag_player(player_id, avatar_fingerprint.avatar_store, placeholder=True)
+                return create_placeholder_avatar(player_name, team_abbr)
+            avatar_fingerprint.clear_player(player_id, avatar_fingerprint.avatar_store)
+            return img
         else:
             print(f"Could not get image for {player_name}, creating placeholder")
+            avatar_fingerprint.flag_player(player_id, avatar_fingerprint.avatar_store, placeholder=True)
             return create_placeholder_avatar(player_name, team_abbr)
     except Exception as e:
         print(f"Error getting image for {player_name}: {e}")
         return create_placeholder_avatar(player_name, team_abbr)
 
-# Create a directory for player avatars if it doesn't exist
-os.makedirs('images/avatars', exist_ok=True)
-
-# Get or create avatars for each player in the top players list
-print("\nGetting player avatars...")
-for idx, player in top_players.iterrows():
-    player_id = player['PLAYER_ID']
-    player_name = player['PLAYER_NAME']
-    team_abbr = player['TEAM_ABBREVIATION']
-    
+# Build the on-disk avatar path for a player
+def get_avatar_path(player_id, player_name):
     # Create a clean filename
     clean_name = "".join(c if c.isalnum() else "_" for c in player_name)
-    avatar_path = f'images/avatars/{clean_name}_{player_id}.png'
-    
-    # Check if we already have the avatar
-    if not os.path.exists(avatar_path):
-        print(f"Getting avatar for {player_name}...")
-        avatar = get_player_avatar(player_id, player_name, team_abbr)
-        avatar.save(avatar_path)
-        # Sleep briefly to avoid rate limiting
-        time.sleep(0.2)
-    
-    # Add the avatar path to the dataframe
-    top_players.at[idx, 'AVATAR_PATH'] = avatar_path
-
-# Save the processed data
-top_players.to_csv('data/processed_players_for_visualization.csv', index=False)
-print("\nProcessed data saved to data/processed_players_for_visualization.csv")
-
-print("\nData processing completed successfully.")
+    return f'images/avatars/{clean_name}_{player_id}.png'
+
+# Bring the league-wide metrics up to date from the change log written by
+# scrape_nba_stats.py, reprocessing only the players named in entries that
+# have not been applied yet. Returns the metrics and the players reprocessed.
+def update_league_metrics(stats_path='data/nba_player_stats.csv', min_games=min_games):
+    import delta_ingest  # delta_ingest imports this module
+
+    applied = 0
+    first_run = not (os.path.exists(metrics_state_path) and os.path.exists(metrics_path))
+    if not first_run:
+        with open(metrics_state_path) as f:
+            applied = json.load(f)['applied_entries']
+    entries = delta_ingest.read_change_log(start=applied)
+    stats = delta_ingest.load_snapshot(stats_path)
+
+    if first_run:
+        # First run: every player is processed once
+        metrics = None
+        changeset = delta_ingest.diff_snapshots(None, stats)
+    else:
+        metrics = delta_ingest.load_snapshot(metrics_path)
+        changeset = delta_ingest.changeset_from_log(entries, stats)
+
+    # Avatars are attached later, to the selected top players only
+    metrics = delta_ingest.update_metrics(metrics, changeset, min_games, with_avatars=False)
+    # Keep the scraped row order, so ties break as in a full run
+    order = stats[delta_ingest.key_column][stats[delta_ingest.key_column].isin(metrics[delta_ingest.key_column])]
+    metrics = metrics.set_index(delta_ingest.key_column).loc[order].reset_index()
+    metrics.to_csv(metrics_path, index=False)
+    with open(metrics_state_path, 'w') as f:
+        json.dump({'applied_entries': applied + len(entries)}, f)
+    return metrics, len(delta_ingest.affected_player_ids(changeset))
+
+# Get or create avatars for each player in the top players list
+def attach_avatars(top_players):
+    # Create a directory for player avatars if it doesn't exist
+    os.makedirs('images/avatars', exist_ok=True)
+    avatar_fingerprint.seed_fallback_table()
+
+    downloaded = False
+    for idx, player in top_players.iterrows():
+        player_id = player['PLAYER_ID']
+        player_name = player['PLAYER_NAME']
+        team_abbr = player['TEAM_ABBREVIATION']
+
+        avatar_path = get_avatar_path(player_id, player_name)
+
+        # Check if we already have the avatar, or if a fallback headshot is due for a recheck
+        if not os.path.exists(avatar_path) or avatar_fingerprint.recheck_due(player_id, avatar_fingerprint.avatar_store):
+            print(f"Getting avatar for {player_name}...")
+            avatar = get_player_avatar(player_id, player_name, team_abbr)
+            avatar_fingerprint.save_avatar(avatar, avatar_path)
+            downloaded = True
+            # Sleep briefly to avoid rate limiting
+            time.sleep(0.2)
+
+        # Add the avatar path to the dataframe
+        top_players.at[idx, 'AVATAR_PATH'] = avatar_path
+
+    # Scan the avatars in one batch after new downloads, which learns a
+    # silhouette the table does not know yet once several players share it
+    if downloaded:
+        avatar_fingerprint.scan_avatars(avatar_fingerprint.avatar_store)
+
+    # Replace stored fallback headshots found by a scan with placeholders
+    for _, player in top_players.iterrows():
+        if avatar_fingerprint.needs_placeholder(player['PLAYER_ID'], avatar_fingerprint.avatar_store):
+            placeholder = create_placeholder_avatar(player['PLAYER_NAME'], player['TEAM_ABBREVIATION'])
+            avatar_fingerprint.save_avatar(placeholder, player['AVATAR_PATH'])
+            avatar_fingerprint.mark_placeholder(player['PLAYER_ID'], avatar_fingerprint.avatar_store)
+
+    return top_players
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process NBA player statistics for visualization.')
+    parser.add_argument('--chunked', action='store_true',
+                        help='Read the CSV in fixed-size chunks to keep memory use constant')
+    parser.add_argument('--chunk-size', type=int, default=chunk_size)
+    parser.add_argument('--incremental', action='store_true',
+                        help='Reprocess only the players in new change log entries')
+    args = parser.parse_args()
+
+    print("Processing NBA player statistics for visualization...")
+
+    if args.chunked:
+        top_players, total_count, filtered_count = select_top_players_chunked(
+            'data/nba_player_stats.csv', args.chunk_size, min_games, top_n)
+        print(f"Total number of players: {total_count}")
+        print(f"Players with at least {min_games} games played: {filtered_count}")
+    elif args.incremental:
+        filtered_df, reprocessed = update_league_metrics('data/nba_player_stats.csv', min_games)
+        print(f"Reprocessed {reprocessed} players from the change log")
+        print(f"Players with at least {min_games} games played: {len(filtered_df)}")
+        top_players = select_top_players(filtered_df, top_n)
+    else:
+        # Load the player statistics data
+        df = pd.read_csv('data/nba_player_stats.csv')
+
+        # Display basic information about the dataset
+        print(f"Total number of players: {len(df)}")
+        print(f"Columns in the dataset: {', '.join(df.columns)}")
+
+        filtered_df = filter_players(df, min_games)
+        print(f"Players with at least {min_games} games played: {len(filtered_df)}")
+
+        # Select top 50 players by points for visualization
+        top_players = select_top_players(filtered_df, top_n)
+
+    print(f"Selected top {len(top_players)} players by points for visualization")
+
+    # Display the top 10 players and their stats
+    print("\nTop 10 players by points:")
+    print(top_players[['PLAYER_NAME', 'TEAM_ABBREVIATION', 'GP', 'PTS', 'FGA', 'PTS_per_FGA']].head(10))
+
+    pts_median, fga_median = get_quadrant_thresholds(top_players)
+
+    print(f"\nMedian values for quadrant boundaries:")
+    print(f"Points (PTS) median: {pts_median}")
+    print(f"Field Goal Attempts (FGA) median: {fga_median}")
+
+    top_players = assign_quadrants(top_players, pts_median, fga_median)
+
+    # Count players in each quadrant
+    quadrant_counts = top_players['Quadrant'].value_counts()
+    print("\nPlayers in each quadrant:")
+    print(quadrant_counts)
+
+    print("\nGetting player avatars...")
+    top_players = attach_avatars(top_players)
+
+    # Save the processed data
+    top_players.to_csv('data/processed_players_for_visualization.csv', index=False)
+    print("\nProcessed data saved to data/processed_players_for_visualization.csv")
+
+    print("\nData processing completed successfully.")
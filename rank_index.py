@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+key_column = 'PLAYER_ID'
+
+# Per-column sorted orders and percentile ranks for every numeric stat, built
+# once per snapshot. Leaderboards walk the stored order and apply filters as
+# boolean masks, so no query ever sorts the data again.
+class RankIndex:
+    def __init__(self, df):
+        self.frame = df.reset_index(drop=True).copy()
+        self.active = np.ones(len(self.frame), dtype=bool)
+        self.positions = {player_id: i for i, player_id in enumerate(self.frame[key_column])}
+        self.columns = [column for column in self.frame.select_dtypes(include='number').columns
+                        if column != key_column and not column.endswith('_ID')]
+        self.orders = {}
+        self.valid_counts = {}
+        self.percentiles = {}
+        for column in self.columns:
+            self.build_column(column)
+
+    # Sort one column descending (missing values last) and compute its percentiles
+    def build_column(self, column):
+        values = self.frame[column].to_numpy(dtype=float)
+        order = np.argsort(-values, kind='stable')
+        valid = ~np.isnan(values[order])
+        self.orders[column] = order[valid].astype(np.int32)
+        self.valid_counts[column] = int(valid.sum())
+        self.update_percentiles(column)
+
+    # Percentile of each row among the active players, from the stored order without re-sorting
+    def update_percentiles(self, column):
+        order = self.orders[column]
+        order = order[self.active[order]]
+        values = self.frame[column].to_numpy(dtype=float)
+        ascending = values[order[::-1]]
+
+        percentiles = np.full(len(self.frame), np.nan, dtype=np.float32)
+        if len(ascending):
+            # Share of active players with a value less than or equal to each player's
+            percentiles[order] = np.searchsorted(ascending, values[order], side='right') / len(ascending) * 100
+        self.percentiles[column] = percentiles
+
+    # Boolean mask of the rows passing the leaderboard filters
+    def filter_mask(self, team=None, min_games=None, player_ids=None):
+        mask = self.active.copy()
+        if team is not None:
+            mask &= (self.frame['TEAM_ABBREVIATION'] == team).to_numpy()
+        if min_games is not None:
+            mask &= (self.frame['GP'] >= min_games).to_numpy()
+        if player_ids is not None:
+            mask &= self.frame[key_column].isin(player_ids).to_numpy()
+        return mask
+
+    # Top k rows by a column, optionally filtered by team, minimum games or a set of players
+    def top_k(self, column, k=10, ascending=False, team=None, min_games=None, player_ids=None):
+        order = self.orders[column]
+        if ascending:
+            order = order[::-1]
+        mask = self.filter_mask(team, min_games, player_ids)
+        selected = order[mask[order]][:k]
+        return self.frame.iloc[selected]
+
+    # Percentile rank (0-100) of a player in a stat among all active players
+    def percentile(self, player_id, column):
+        position = self.positions.get(player_id)
+        if position is None or not self.active[position]:
+            return None
+        value = self.percentiles[column][position]
+        return None if np.isnan(value) else float(value)
+
+    # Apply changed players incrementally: updated and new rows are removed
+    # from each sorted order and re-inserted at their new positions with a
+    # binary search, and removed players are deactivated
+    def update(self, upserts, removed_ids=()):
+        changed_positions = []
+        new_rows = []
+        for _, row in upserts.iterrows():
+            position = self.positions.get(row[key_column])
+            if position is None:
+                new_rows.append(row)
+            else:
+                self.frame.loc[position, row.index] = row.values
+                self.active[position] = True
+                changed_positions.append(position)
+
+        if new_rows:
+            start = len(self.frame)
+            self.frame = pd.concat([self.frame, pd.DataFrame(new_rows)], ignore_index=True)
+            self.active = np.concatenate([self.active, np.ones(len(new_rows), dtype=bool)])
+            for i, row in enumerate(new_rows):
+                self.positions[row[key_column]] = start + i
+                changed_positions.append(start + i)
+
+        for player_id in removed_ids:
+            position = self.positions.get(player_id)
+            if position is not None:
+                self.active[position] = False
+
+        changed_positions = np.asarray(changed_positions, dtype=np.int32)
+        for column in self.columns:
+            values = self.frame[column].to_numpy(dtype=float)
+            order = self.orders[column]
+            if len(changed_positions):
+                order = order[~np.isin(order, changed_positions)]
+
+                # Insert the changed rows into the descending order by binary search.
+                # Ties keep row order, as in a fresh build, so the order is sorted
+                # by (-value, position) and each row goes to its place in its run.
+                inserted = changed_positions[~np.isnan(values[changed_positions])]
+                inserted = inserted[np.lexsort((inserted, -values[inserted]))]
+                keys = -values[order]
+                starts = np.searchsorted(keys, -values[inserted], side='left')
+                ends = np.searchsorted(keys, -values[inserted], side='right')
+                slots = starts + np.array([np.searchsorted(order[start:end], position)
+                                           for start, end, position in zip(starts, ends, inserted)], dtype=np.intp)
+                order = np.insert(order, slots, inserted).astype(np.int32)
+
+            self.orders[column] = order
+            self.valid_counts[column] = len(order)
+            self.update_percentiles(column)
@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# zstandard compresses better and faster than gzip, but is optional
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Root of the content-addressed raw payload archive
+archive_dir = 'data/raw'
+
+# Append-only index of every archived fetch, one JSON object per line
+index_path = os.path.join(archive_dir, 'index.jsonl')
+
+# Compression settings
+zstd_level = 10
+gzip_level = 6
+
+# Compress payload bytes with zstd when available, otherwise gzip
+def compress(content):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=zstd_level).compress(content), '.zst'
+    return gzip.compress(content, compresslevel=gzip_level), '.gz'
+
+# Decompress payload bytes based on the file extension
+def decompress(data, extension):
+    if extension == '.zst':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst payloads (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+# Find the stored file for a content hash, whichever compression it was written with
+def payload_path(content_hash, root=archive_dir):
+    directory = os.path.join(root, content_hash[:2])
+    for extension in ('.zst', '.gz'):
+        path = os.path.join(directory, content_hash + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+# Store a fetched payload under its content hash and record the fetch in the index.
+# The payload is only written when that hash is not already in the archive.
+def archive_payload(content, url, params=None, kind='json', fetched_at=None, root=archive_dir):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    path = payload_path(content_hash, root)
+    stored = path is None
+    if stored:
+        compressed, extension = compress(content)
+        path = os.path.join(root, content_hash[:2], content_hash + extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+
+    entry = {
+        'fetched_at': fetched_at or pd.Timestamp.now().isoformat(),
+        'hash': content_hash,
+        'kind': kind,
+        'url': url,
+        'params': params or {},
+        'size': len(content),
+        'stored_size': os.path.getsize(path),
+        'new': stored,
+    }
+    with open(os.path.join(root, 'index.jsonl'), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+    return entry
+
+# Read an archived payload back as bytes
+def read_payload(content_hash, root=archive_dir):
+    path = payload_path(content_hash, root)
+    if path is None:
+        raise FileNotFoundError(f"No archived payload with hash {content_hash}")
+    with open(path, 'rb') as f:
+        return decompress(f.read(), os.path.splitext(path)[1])
+
+# Read an archived JSON payload
+def read_json_payload(content_hash, root=archive_dir):
+    return json.loads(read_payload(content_hash, root))
+
+# Index entries filtered by fetch time (ISO strings or timestamps), kind and request params
+def find_payloads(since=None, until=None, kind=None, root=archive_dir, **params):
+    path = os.path.join(root, 'index.jsonl')
+    if not os.path.exists(path):
+        return []
+
+    since = pd.Timestamp(since).isoformat() if since is not None else None
+    until = pd.Timestamp(until).isoformat() if until is not None else None
+
+    entries = []
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if since is not None and entry['fetched_at'] < since:
+                continue
+            if until is not None and entry['fetched_at'] > until:
+                continue
+            if kind is not None and entry['kind'] != kind:
+                continue
+            if any(entry['params'].get(key) != value for key, value in params.items()):
+                continue
+            entries.append(entry)
+    return entries
+
+# Disk usage of the archive compared with the raw payload sizes it stands for
+def archive_summary(root=archive_dir):
+    entries = find_payloads(root=root)
+    stored = {entry['hash']: entry['stored_size'] for entry in entries}
+    return {
+        'fetches': len(entries),
+        'unique_payloads': len(stored),
+        'raw_bytes': sum(entry['size'] for entry in entries),
+        'stored_bytes': sum(stored.values()),
+    }
+
+if __name__ == '__main__':
+    summary = archive_summary()
+    print(f"Archived fetches: {summary['fetches']}")
+    print(f"Unique payloads: {summary['unique_payloads']}")
+    print(f"Raw size: {summary['raw_bytes'] / 1e6:.1f} MB, stored size: {summary['stored_bytes'] / 1e6:.1f} MB")
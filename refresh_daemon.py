@@ -0,0 +1,531 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+from matplotlib.figure import Figure, SubplotParams
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox, IdentityTransform
+
+import scrape_nba_stats as scraper
+import process_data
+import delta_ingest
+import snapshot_store
+import raw_archive
+import finalize_visualization as renderer
+from rank_index import RankIndex
+
+# Default daemon settings
+poll_interval = 300  # seconds between API polls
+host = '127.0.0.1'
+port = 8765
+render_dpi = 150
+
+# Directory where the daemon writes the charts it renders
+daemon_output_dir = 'output/daemon'
+
+# Overlay sprites (rasterized texts and legends) kept per chart figure. Texts
+# that are the same on every chart stay cached; the efficiency list and data
+# summary of each chart cycle through the rest.
+overlay_limit = 32
+
+# Pixels kept around an artist's extent when it is rasterized, for line widths and antialiasing
+sprite_padding = 4
+
+# Padding around the tight bounding box of a saved chart, as in savefig(bbox_inches='tight')
+crop_padding = 0.1
+
+# zlib level for the PNG encoder; fast compression keeps encoding in the tens of milliseconds
+png_compress_level = 1
+
+# Columns a chart depends on; a chart is re-rendered only when these change
+chart_columns = ['PLAYER_ID', 'PLAYER_NAME', 'TEAM_ABBREVIATION', 'GP', 'PTS', 'FGA', 'PTS_per_FGA', 'AVATAR_PATH']
+
+# Fingerprint the rows a chart is drawn from
+def frame_fingerprint(frame):
+    columns = [column for column in chart_columns if column in frame.columns]
+    hashed = pd.util.hash_pandas_object(frame[columns], index=False)
+    return hashlib.sha1(hashed.values.tobytes()).hexdigest()
+
+# A pre-rendered block of pixels (bottom row first, as renderers expect) drawn
+# at a fixed pixel offset from an anchor point. Text and avatar pixels do not
+# depend on where they sit on a chart, so the daemon rasterizes them once and
+# then only places them.
+class Sprite(Artist):
+    def __init__(self, pixels, offset, xy, transform):
+        super().__init__()
+        self.pixels, self.offset, self.xy = pixels, offset, xy
+        self.set_transform(transform)
+        # Player names may hang outside the plot, as annotations do
+        self.set_clip_on(False)
+
+    def origin(self):
+        x, y = self.get_transform().transform(self.xy)
+        return round(x + self.offset[0]), round(y + self.offset[1])
+
+    def get_window_extent(self, renderer=None):
+        x, y = self.origin()
+        return Bbox.from_bounds(x, y, self.pixels.shape[1], self.pixels.shape[0])
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        x, y = self.origin()
+        gc = renderer.new_gc()
+        renderer.draw_image(gc, x, y, self.pixels)
+        gc.restore()
+
+# Cache key of an overlay (a text or the legend): its content and style
+def overlay_key(artist):
+    if isinstance(artist, Text):
+        patch = artist.get_bbox_patch()
+        return (artist.get_text(), artist.get_fontproperties(), str(artist.get_color()),
+                artist.get_horizontalalignment(), artist.get_verticalalignment(),
+                None if patch is None else (tuple(patch.get_facecolor()), tuple(patch.get_edgecolor())))
+    return ('legend',) + tuple(text.get_text() for text in artist.get_texts())
+
+# The daemon's warm chart figure, shared by every chart it renders. The axes,
+# ticks and footer are built once. Each render swaps in the chart's quadrant
+# background, players, labels and panel texts, lays the figure out for them
+# and measures the crop, as savefig(bbox_inches='tight') would. Player
+# markers and overlay texts are drawn from rasterized copies: a marker is
+# redrawn only when the player's line changes, and texts that are the same on
+# every chart (quadrant labels, legend, methodology) are rasterized once.
+# The figure is built without pyplot so it can be kept across refreshes,
+# which the daemon serializes with its lock.
+class ChartTemplate:
+    def __init__(self, dpi=render_dpi):
+        self.figure = Figure(figsize=renderer.figure_size, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax_main, self.ax_eff, self.ax_info = renderer.add_chart_axes(self.figure)
+        renderer.draw_footer(self.figure)
+        defaults = SubplotParams()
+        self.default_layout = {name: getattr(defaults, name) for name in ('left', 'bottom', 'right', 'top', 'wspace', 'hspace')}
+        self.bounds = None
+        self.bounds_artists = []
+        self.artists = []
+
+        # Transparent buffer the size of the figure that sprites are rasterized on
+        width, height = self.figure.canvas.get_width_height()
+        self.scratch = RendererAgg(width, height, dpi)
+        # Avatar and stats line sprites by player ID, with the inputs each was drawn from
+        self.markers = {}
+        # Overlay sprites by content, least recently used first
+        self.overlays = OrderedDict()
+
+    # Redraw the static part of the main plot for new quadrant bounds. Only the
+    # patches and lines are replaced; clearing the axes would rebuild every tick.
+    def set_bounds(self, bounds):
+        for artist in self.bounds_artists:
+            artist.remove()
+        self.bounds_artists = renderer.draw_quadrant_background(self.ax_main, bounds)
+        self.ax_main.relim()
+        self.ax_main.autoscale_view()
+        self.bounds = bounds
+
+    # Draw artists on the scratch buffer and cut out their pixels, with the
+    # offset of the lower left corner from the anchor (display coordinates)
+    def rasterize(self, artists, anchor):
+        for artist in artists:
+            artist.draw(self.scratch)
+        boxes = [artist.get_window_extent(self.scratch) for artist in artists]
+        boxes += [artist.get_bbox_patch().get_window_extent(self.scratch) for artist in artists
+                  if isinstance(artist, Text) and artist.get_bbox_patch() is not None]
+        x0, y0, x1, y1 = Bbox.union(boxes).padded(sprite_padding).extents
+
+        # The buffer's rows start at the top; clear the cut-out region for the next sprite
+        buffer = np.asarray(self.scratch.buffer_rgba())
+        height, width = buffer.shape[:2]
+        left, right = max(int(x0), 0), min(int(np.ceil(x1)), width)
+        top, bottom = max(height - int(np.ceil(y1)), 0), min(height - int(y0), height)
+        pixels = buffer[top:bottom, left:right][::-1].copy()
+        buffer[top:bottom, left:right] = (255, 255, 255, 0)
+        return pixels, (left - anchor[0], height - bottom - anchor[1])
+
+    # Draw the players on the main plot: marker sprites for players with an
+    # avatar, and the usual dot and label (see draw_player_avatars) for the rest.
+    # A marker is two sprites, the avatar with name and team, and the stats
+    # line below it, so a changed stats line leaves the avatar cached.
+    def draw_players(self, frame):
+        artists = []
+        transform = self.ax_main.transData
+        for i, (_, player) in enumerate(frame.iterrows()):
+            path = player.get('AVATAR_PATH')
+            if not (isinstance(path, str) and os.path.exists(path)):
+                artists += renderer.draw_player_avatars(self.ax_main, frame.iloc[[i]])
+                continue
+
+            xy = (player['FGA'], player['PTS'])
+            anchor = transform.transform(xy)
+            avatar_inputs = (path, os.path.getmtime(path), player['PLAYER_NAME'], player['TEAM_ABBREVIATION'])
+            stat_inputs = (player['PTS'], player['GP'], player['PTS_per_FGA'])
+            avatar, stat_line = self.markers.get(player['PLAYER_ID'], (None, None))
+            if avatar is None or avatar[0] != avatar_inputs:
+                drawn = renderer.draw_avatar_marker(self.ax_main, player)
+                avatar = (avatar_inputs, *self.rasterize(drawn, anchor))
+                for artist in drawn:
+                    artist.remove()
+            if stat_line is None or stat_line[0] != stat_inputs:
+                drawn = renderer.draw_stat_line(self.ax_main, player)
+                stat_line = (stat_inputs, *self.rasterize([drawn], anchor))
+                drawn.remove()
+            self.markers[player['PLAYER_ID']] = (avatar, stat_line)
+            artists.append(self.ax_main.add_artist(Sprite(avatar[1], avatar[2], xy, transform)))
+            artists.append(self.ax_main.add_artist(Sprite(stat_line[1], stat_line[2], xy, transform)))
+        return artists
+
+    # Sprite for an overlay (a text or the legend), rasterized on first use
+    def overlay_sprite(self, artist):
+        if isinstance(artist, Text):
+            xy, transform = artist.get_unitless_position(), artist.get_transform()
+        else:
+            xy, transform = artist.get_window_extent(self.scratch).p0, IdentityTransform()
+
+        key = overlay_key(artist)
+        if key in self.overlays:
+            self.overlays.move_to_end(key)
+        else:
+            self.overlays[key] = self.rasterize([artist], transform.transform(xy))
+            while len(self.overlays) > overlay_limit:
+                self.overlays.popitem(last=False)
+        return Sprite(*self.overlays[key], xy, transform)
+
+    # Render the chart for a frame and return the cropped RGB image
+    def render(self, frame, rank_index=None):
+        for artist in self.artists:
+            artist.remove()
+        bounds = renderer.get_chart_bounds(frame)
+        if bounds != self.bounds:
+            self.set_bounds(bounds)
+        # Dots of players without an avatar take the colors of a fresh figure
+        self.ax_main.set_prop_cycle(None)
+
+        players = self.draw_players(frame)
+        overlays = renderer.draw_quadrant_labels(self.ax_main, bounds)
+        legend = self.ax_main.get_legend()
+        if legend is not None:
+            overlays.append(legend)
+        overlays += renderer.draw_efficiency_panel(self.ax_eff, frame, rank_index)
+        overlays += renderer.draw_info_panel(self.ax_info, frame, bounds)
+        # The legend belongs to the axes and is only redrawn, never removed
+        self.artists = [artist for artist in players + overlays if artist is not legend]
+
+        # Lay out and measure the figure for this chart's texts and players,
+        # starting from the default subplot positions as a new figure would
+        canvas = self.figure.canvas
+        self.figure.subplots_adjust(**self.default_layout)
+        renderer.adjust_layout(self.figure)
+        tight = self.figure.get_tightbbox(canvas.get_renderer()).padded(crop_padding)
+        # savefig sizes the saved canvas by truncating the box to whole pixels,
+        # with the same tolerance for floating point error as the canvas
+        x0, y0 = int(tight.x0 * self.figure.dpi + 1e-8), int(tight.y0 * self.figure.dpi + 1e-8)
+        x1 = x0 + int(tight.width * self.figure.dpi + 1e-8)
+        y1 = y0 + int(tight.height * self.figure.dpi + 1e-8)
+
+        # Artists marked animated are skipped by the full draw and drawn on top
+        # afterwards, the overlays from their sprites
+        for artist in players + overlays:
+            artist.set_animated(True)
+        canvas.draw()
+        for artist in players:
+            self.figure.draw_artist(artist)
+        for artist in overlays:
+            self.figure.draw_artist(self.overlay_sprite(artist))
+
+        # Crop to the tight bounding box (the buffer's origin is at the top)
+        pixels = np.asarray(canvas.buffer_rgba())
+        height, width = pixels.shape[:2]
+        return pixels[max(height - y1, 0):min(height - y0, height), max(x0, 0):min(x1, width), :3].copy()
+
+# Encode a rendered chart as PNG bytes. Pillow tries every PNG row filter on
+# every row, which takes most of a render at this size; one "up" filter
+# (each row minus the row above) with fast zlib compression is several times
+# quicker for about the same file size.
+def encode_png(pixels):
+    height, width = pixels.shape[:2]
+    rows = pixels.reshape(height, width * 3)
+    filtered = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    filtered[:, 0] = 2  # the "up" filter
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(filtered.tobytes(), png_compress_level))
+            + chunk(b'IEND', b''))
+
+# Everything the daemon keeps warm between refreshes
+class WarmState:
+    def __init__(self, dpi=render_dpi):
+        # Refreshes are serialized because matplotlib figures are not thread safe
+        self.lock = threading.Lock()
+        self.dpi = dpi
+
+        # Conditional request state for the stats API
+        self.etag = None
+        self.last_modified = None
+        self.payload_hash = None
+
+        # Parsed dataset, processed metrics and per-chart render state
+        self.players = None
+        self.metrics = None
+        self.rank_index = None
+        self.dirty_teams = None  # None means every team chart needs checking
+        self.fingerprints = {}
+        self.images = {}
+        self.template = ChartTemplate(dpi)
+        self.store = snapshot_store.SnapshotStore()
+
+        self.last_refresh = None
+        self.last_result = None
+
+    # Load the last scraped snapshot from disk so the first render needs no network
+    def load_snapshot(self, path=delta_ingest.snapshot_path):
+        snapshot = delta_ingest.load_snapshot(path)
+        if snapshot is not None:
+            self.apply_changeset(delta_ingest.diff_snapshots(None, snapshot), snapshot)
+            print(f"Loaded {len(self.players)} players from {path}")
+
+    # Fold a changeset into the warm dataset, reprocessing only the affected players
+    def apply_changeset(self, changeset, players):
+        teams = delta_ingest.affected_teams(changeset, self.players)
+        if self.players is None:
+            self.dirty_teams = None
+        elif self.dirty_teams is not None:
+            self.dirty_teams |= teams
+
+        self.metrics = delta_ingest.update_metrics(self.metrics, changeset)
+        self.players = players
+
+        # Keep the league rank index current for the players in the changeset only
+        if self.rank_index is None:
+            self.rank_index = RankIndex(self.metrics)
+        else:
+            affected = delta_ingest.affected_player_ids(changeset)
+            upserts = self.metrics[self.metrics[delta_ingest.key_column].isin(affected)]
+            removed = affected - set(upserts[delta_ingest.key_column])
+            self.rank_index.update(upserts, removed)
+
+    # Build the input frame of the overall chart and of every team chart that may have changed
+    def chart_inputs(self):
+        top_players = process_data.select_top_players(self.metrics)
+        pts_median, fga_median = process_data.get_quadrant_thresholds(top_players)
+        inputs = {'quadrant': process_data.assign_quadrants(top_players, pts_median, fga_median)}
+
+        # One chart per team with that team's qualifying players
+        for team, team_players in self.metrics.groupby('TEAM_ABBREVIATION'):
+            if self.dirty_teams is None or team in self.dirty_teams:
+                inputs[f'team-{team}'] = team_players.sort_values('PTS', ascending=False).copy()
+
+        return inputs
+
+    # Re-render only the charts whose inputs changed since the last render
+    def render_changed(self):
+        os.makedirs(daemon_output_dir, exist_ok=True)
+        inputs = self.chart_inputs()
+        rendered = []
+
+        for name, frame in inputs.items():
+            fingerprint = frame_fingerprint(frame)
+            if self.fingerprints.get(name) == fingerprint and name in self.images:
+                continue
+
+            image = encode_png(self.template.render(frame, self.rank_index))
+            with open(os.path.join(daemon_output_dir, f'{name}.png'), 'wb') as f:
+                f.write(image)
+
+            self.images[name] = image
+            self.fingerprints[name] = fingerprint
+            rendered.append(name)
+
+        # Drop charts whose inputs no longer exist (e.g. a team with no qualifying players)
+        checked_teams = self.dirty_teams
+        for name in set(self.images) - set(inputs):
+            if checked_teams is None or name[len('team-'):] in checked_teams:
+                del self.images[name]
+                del self.fingerprints[name]
+
+        self.dirty_teams = set()
+        return rendered
+
+    # Poll the stats API with a conditional request and update the warm dataset
+    def poll(self):
+        conditional_headers = {}
+        if self.etag:
+            conditional_headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            conditional_headers['If-Modified-Since'] = self.last_modified
+
+        response = scraper.request_player_stats(extra_headers=conditional_headers)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+
+        self.etag = response.headers.get('ETag', self.etag)
+        self.last_modified = response.headers.get('Last-Modified', self.last_modified)
+
+        # The API does not always honour conditional requests, so compare payloads too
+        payload_hash = hashlib.sha1(response.content).hexdigest()
+        if payload_hash == self.payload_hash:
+            return False
+
+        df = scraper.player_stats_to_dataframe(response.json())
+        if df is None:
+            print("Could not find expected data structure in API response")
+            return False
+
+        self.payload_hash = payload_hash
+        raw_archive.archive_payload(response.content, scraper.api_url, scraper.params)
+
+        # Only the players in the changeset flow through the rest of the pipeline
+        changeset = delta_ingest.diff_snapshots(self.players, df)
+        if delta_ingest.changeset_is_empty(changeset):
+            return False
+        delta_ingest.append_change_log(changeset)
+        print(f"Changes since last poll: {delta_ingest.describe_changeset(changeset)}")
+        self.store.append(df)
+
+        self.apply_changeset(changeset, df)
+        return True
+
+    # Poll for new data and re-render what changed
+    def refresh(self, fetch=True, force=False):
+        with self.lock:
+            start = time.perf_counter()
+            changed = False
+            error = None
+
+            if fetch:
+                try:
+                    changed = self.poll()
+                except Exception as e:
+                    error = str(e)
+                    print(f"Error polling NBA API: {e}")
+
+            rendered = []
+            if force:
+                self.dirty_teams = None
+            render_start = time.perf_counter()
+            if self.metrics is not None and (changed or force or not self.images):
+                rendered = self.render_changed()
+            render_ms = (time.perf_counter() - render_start) * 1000
+
+            self.last_refresh = pd.Timestamp.now().isoformat()
+            self.last_result = {
+                'changed': changed,
+                'rendered': rendered,
+                'error': error,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+                # Time spent re-rendering the changed charts, for the whole refresh
+                'render_ms': round(render_ms, 1),
+                'refreshed_at': self.last_refresh,
+            }
+            return self.last_result
+
+    def status(self):
+        return {
+            'players': 0 if self.players is None else len(self.players),
+            'charts': sorted(self.images),
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'cached_images': len(renderer.image_cache),
+            'last_result': self.last_result,
+        }
+
+# Tiny local HTTP endpoint for triggering refreshes and fetching charts
+def make_handler(state):
+    class DaemonRequestHandler(BaseHTTPRequestHandler):
+        def send_json(self, payload, status=200):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+
+            if path == '/status':
+                self.send_json(state.status())
+            elif path == '/refresh':
+                self.send_json(state.refresh(force='force' in self.path))
+            elif path.startswith('/chart'):
+                # /chart or /chart/latest serve the main quadrant chart
+                name = path[len('/chart/'):] if path.startswith('/chart/') else 'latest'
+                if name in ('', 'latest'):
+                    name = 'quadrant'
+                image = state.images.get(name)
+                if image is None:
+                    self.send_json({'error': f'No chart named {name}'}, status=404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(image)))
+                self.end_headers()
+                self.wfile.write(image)
+            else:
+                self.send_json({'error': 'Not found'}, status=404)
+
+        do_POST = do_GET
+
+        # Keep the console quiet except for errors
+        def log_message(self, format, *args):
+            pass
+
+    return DaemonRequestHandler
+
+# Poll the API on an interval until asked to stop
+def poll_forever(state, interval, stop_event):
+    while not stop_event.wait(interval):
+        result = state.refresh()
+        if result['changed'] or result['rendered']:
+            print(f"Refreshed in {result['duration_ms']} ms ({result['render_ms']} ms rendering), "
+                  f"re-rendered: {', '.join(result['rendered']) or 'nothing'}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep the NBA chart pipeline warm and refresh it on an interval.')
+    parser.add_argument('--host', default=host)
+    parser.add_argument('--port', type=int, default=port)
+    parser.add_argument('--interval', type=int, default=poll_interval, help='Seconds between API polls')
+    parser.add_argument('--dpi', type=int, default=render_dpi)
+    args = parser.parse_args()
+
+    print("Starting NBA chart refresh daemon...")
+
+    state = WarmState(dpi=args.dpi)
+    state.load_snapshot()
+    result = state.refresh()
+    print(f"Initial refresh took {result['duration_ms']} ms ({result['render_ms']} ms rendering "
+          f"{len(result['rendered'])} charts)")
+
+    stop_event = threading.Event()
+    poller = threading.Thread(target=poll_forever, args=(state, args.interval, stop_event), daemon=True)
+    poller.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Serving on http://{args.host}:{args.port} (/status, /refresh, /chart/<name>)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping refresh daemon...")
+    finally:
+        stop_event.set()
+        server.server_close()
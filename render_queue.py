@@ -0,0 +1,543 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import chart_spec
+import snapshot_store
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Default queue: a SQLite file, which can live on storage shared by all render hosts
+queue_path = 'data/render_queue.db'
+
+# A claimed job belongs to its worker until the lease runs out; workers renew
+# it while rendering, so an expired lease means the worker died
+lease_seconds = 120
+
+# Jobs whose worker died or that raised are retried up to this many times
+max_attempts = 3
+
+# Seconds an idle worker waits before asking for work again
+idle_wait = 2
+
+# Jobs are identified by what they render, so enqueueing the same chart for
+# the same snapshot twice is a no-op
+def job_id(snapshot_id, spec):
+    return hashlib.sha1(f'{snapshot_id}:{chart_spec.spec_hash(spec)}'.encode()).hexdigest()
+
+# Queue backed by a SQLite file. Claims run in an IMMEDIATE transaction, which
+# takes the database write lock, so two workers can never claim the same job.
+class SQLiteQueue:
+    def __init__(self, path=queue_path, max_attempts=max_attempts):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self.connect() as db:
+            db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                snapshot_id TEXT NOT NULL,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL)''')
+            db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+
+    # One short-lived connection per operation, so worker threads never share one.
+    # The default rollback journal is used because WAL does not work on network filesystems.
+    @contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    # Add a job unless the same job is already queued, running or done.
+    # Returns True if the job was new.
+    def enqueue(self, snapshot_id, spec):
+        spec = chart_spec.normalize_spec(spec)
+        key = job_id(snapshot_id, spec)
+        now = time.time()
+        with self.connect() as db:
+            inserted = db.execute('INSERT OR IGNORE INTO jobs (id, snapshot_id, spec, created_at, updated_at) '
+                                  'VALUES (?, ?, ?, ?, ?)',
+                                  (key, snapshot_id, json.dumps(spec, sort_keys=True), now, now)).rowcount
+            if not inserted:
+                # Only a job that gave up earlier is queued again
+                inserted = db.execute("UPDATE jobs SET status = 'queued', attempts = 0, error = NULL, updated_at = ? "
+                                      "WHERE id = ? AND status = 'failed'", (now, key)).rowcount
+        return bool(inserted)
+
+    # Claim the oldest runnable job: a queued one, or a running one whose lease expired
+    def claim(self, worker_id, lease=lease_seconds):
+        now = time.time()
+        with self.connect() as db:
+            # Jobs that used up their attempts on dead workers are given up
+            db.execute("UPDATE jobs SET status = 'failed', error = 'lease expired', updated_at = ? "
+                       "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                       (now, now, self.max_attempts))
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' "
+                             "OR (status = 'running' AND lease_expires < ?) "
+                             "ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, "
+                       "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                       (worker_id, now + lease, now, row['id']))
+        return {'id': row['id'], 'snapshot_id': row['snapshot_id'], 'spec': json.loads(row['spec']),
+                'attempts': row['attempts'] + 1}
+
+    # Extend the lease of a job the worker still owns; False means the job was taken over
+    def heartbeat(self, key, worker_id, lease=lease_seconds):
+        now = time.time()
+        with self.connect() as db:
+            return bool(db.execute("UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                                   "WHERE id = ? AND worker = ? AND status = 'running'",
+                                   (now + lease, now, key, worker_id)).rowcount)
+
+    def complete(self, key, worker_id, result):
+        with self.connect() as db:
+            return bool(db.execute("UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL, "
+                                   "updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                   (result, time.time(), key, worker_id)).rowcount)
+
+    # Put a failed job back in the queue, or give up once it is out of attempts
+    def fail(self, key, worker_id, error):
+        with self.connect() as db:
+            db.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                       "error = ?, lease_expires = NULL, updated_at = ? "
+                       "WHERE id = ? AND worker = ? AND status = 'running'",
+                       (self.max_attempts, error, time.time(), key, worker_id))
+
+    def counts(self):
+        with self.connect() as db:
+            return {row['status']: row['total'] for row in
+                    db.execute('SELECT status, COUNT(*) AS total FROM jobs GROUP BY status')}
+
+# Queue backed by Redis: one hash per job, a list of queued job IDs and a
+# sorted set of lease expiry times. Every state change runs as a WATCH/MULTI/
+# EXEC transaction, so it is applied completely or not at all: a worker that
+# dies mid-claim leaves the job queued, and a change made by another client
+# between the check and the write (a lease taken over, a job claimed twice)
+# aborts the transaction instead of overwriting it.
+class RedisQueue:
+    def __init__(self, client, prefix='render', max_attempts=max_attempts):
+        self.client = client
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+        self.queued = f'{prefix}:queued'
+        self.leases = f'{prefix}:leases'
+
+    def job_key(self, key):
+        return f'{self.prefix}:job:{key}'
+
+    # Run a check-then-write step in a transaction on the watched keys,
+    # retrying when another client changes them first
+    def transaction(self, step, *watched):
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*watched)
+                    return step(pipe)
+                except WatchError:
+                    continue
+
+    def enqueue(self, snapshot_id, spec):
+        spec = chart_spec.normalize_spec(spec)
+        key = job_id(snapshot_id, spec)
+        job_key = self.job_key(key)
+
+        def step(pipe):
+            status = pipe.hget(job_key, 'status')
+            # Only a job that gave up earlier is queued again
+            if status is not None and status != 'failed':
+                return False
+            pipe.multi()
+            pipe.hset(job_key, mapping={'snapshot_id': snapshot_id, 'spec': json.dumps(spec, sort_keys=True),
+                                        'status': 'queued', 'attempts': 0, 'worker': '', 'error': '',
+                                        'created_at': time.time()})
+            pipe.lpush(self.queued, key)
+            pipe.execute()
+            return True
+
+        return self.transaction(step, job_key)
+
+    # Move jobs with expired leases back to the queue (or give them up)
+    def requeue_expired(self):
+        for key in self.client.zrangebyscore(self.leases, '-inf', time.time()):
+            job_key = self.job_key(key)
+
+            def step(pipe):
+                # The lease may have been renewed or handled since it was listed
+                expires = pipe.zscore(self.leases, key)
+                if expires is None or expires > time.time():
+                    return
+                attempts = int(pipe.hget(job_key, 'attempts') or 0)
+                pipe.multi()
+                pipe.zrem(self.leases, key)
+                if attempts >= self.max_attempts:
+                    pipe.hset(job_key, mapping={'status': 'failed', 'error': 'lease expired'})
+                else:
+                    pipe.hset(job_key, 'status', 'queued')
+                    pipe.rpush(self.queued, key)
+                pipe.execute()
+
+            self.transaction(step, self.leases, job_key)
+
+    # Pop the oldest queued job, take its lease and mark it running in one transaction
+    def claim(self, worker_id, lease=lease_seconds):
+        self.requeue_expired()
+
+        def step(pipe):
+            key = pipe.lindex(self.queued, -1)
+            if key is None:
+                return None
+            job_key = self.job_key(key)
+            pipe.multi()
+            pipe.rpop(self.queued)
+            pipe.zadd(self.leases, {key: time.time() + lease})
+            pipe.hincrby(job_key, 'attempts', 1)
+            pipe.hset(job_key, mapping={'status': 'running', 'worker': worker_id})
+            pipe.hgetall(job_key)
+            job = pipe.execute()[-1]
+            return {'id': key, 'snapshot_id': job['snapshot_id'], 'spec': json.loads(job['spec']),
+                    'attempts': int(job['attempts'])}
+
+        return self.transaction(step, self.queued)
+
+    # Apply a write to a job only while the worker still owns it
+    def if_owner(self, key, worker_id, write):
+        job_key = self.job_key(key)
+
+        def step(pipe):
+            job = pipe.hgetall(job_key)
+            if job.get('status') != 'running' or job.get('worker') != worker_id:
+                return False
+            pipe.multi()
+            write(pipe, job)
+            pipe.execute()
+            return True
+
+        return self.transaction(step, job_key)
+
+    def heartbeat(self, key, worker_id, lease=lease_seconds):
+        return self.if_owner(key, worker_id,
+                             lambda pipe, job: pipe.zadd(self.leases, {key: time.time() + lease}))
+
+    def complete(self, key, worker_id, result):
+        def write(pipe, job):
+            pipe.zrem(self.leases, key)
+            pipe.hset(self.job_key(key), mapping={'status': 'done', 'result': result})
+        return self.if_owner(key, worker_id, write)
+
+    # Put a failed job back in the queue, or give up once it is out of attempts
+    def fail(self, key, worker_id, error):
+        def write(pipe, job):
+            pipe.zrem(self.leases, key)
+            if int(job['attempts']) >= self.max_attempts:
+                pipe.hset(self.job_key(key), mapping={'status': 'failed', 'error': error})
+            else:
+                pipe.hset(self.job_key(key), mapping={'status': 'queued', 'error': error})
+                pipe.lpush(self.queued, key)
+        self.if_owner(key, worker_id, write)
+
+    def counts(self):
+        counts = {}
+        for job_key in self.client.scan_iter(f'{self.prefix}:job:*'):
+            status = self.client.hget(job_key, 'status')
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+# Raised when a watched key changed before EXEC. LocalRedis raises the same
+# class as redis-py, so RedisQueue handles both clients alike.
+if redis is not None:
+    WatchError = redis.WatchError
+else:
+    class WatchError(Exception):
+        pass
+
+# In-process stand-in for the Redis commands RedisQueue uses (with
+# decode_responses=True semantics), for running the queue locally and in
+# tests without a Redis server. Every write bumps a per-key version, which
+# is how pipelines detect that a watched key changed.
+class LocalRedis:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = {}
+        self.versions = {}
+
+    def touch(self, name):
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+    def pipeline(self):
+        return LocalPipeline(self)
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self.lock:
+            table = self.data.setdefault(name, {})
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            table.update({k: str(v) for k, v in items.items()})
+            self.touch(name)
+            return len(items)
+
+    def hget(self, name, key):
+        with self.lock:
+            return self.data.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        with self.lock:
+            return dict(self.data.get(name, {}))
+
+    def hincrby(self, name, key, amount=1):
+        with self.lock:
+            table = self.data.setdefault(name, {})
+            table[key] = str(int(table.get(key, 0)) + amount)
+            self.touch(name)
+            return int(table[key])
+
+    def lpush(self, name, *values):
+        with self.lock:
+            items = self.data.setdefault(name, [])
+            for value in values:
+                items.insert(0, str(value))
+            self.touch(name)
+            return len(items)
+
+    def rpush(self, name, *values):
+        with self.lock:
+            items = self.data.setdefault(name, [])
+            items.extend(str(value) for value in values)
+            self.touch(name)
+            return len(items)
+
+    def rpop(self, name):
+        with self.lock:
+            items = self.data.get(name)
+            if not items:
+                return None
+            self.touch(name)
+            return items.pop()
+
+    def lindex(self, name, index):
+        with self.lock:
+            items = self.data.get(name, [])
+            return items[index] if -len(items) <= index < len(items) else None
+
+    def zadd(self, name, mapping):
+        with self.lock:
+            self.data.setdefault(name, {}).update({str(k): float(v) for k, v in mapping.items()})
+            self.touch(name)
+            return len(mapping)
+
+    def zscore(self, name, member):
+        with self.lock:
+            return self.data.get(name, {}).get(member)
+
+    def zrangebyscore(self, name, low, high):
+        with self.lock:
+            low, high = float(low), float(high)
+            scores = self.data.get(name, {})
+            return [member for member, score in sorted(scores.items(), key=lambda item: item[1])
+                    if low <= score <= high]
+
+    def zrem(self, name, *members):
+        with self.lock:
+            scores = self.data.get(name, {})
+            removed = sum(scores.pop(member, None) is not None for member in members)
+            if removed:
+                self.touch(name)
+            return removed
+
+    def scan_iter(self, match):
+        with self.lock:
+            prefix = match.rstrip('*')
+            return [name for name in self.data if name.startswith(prefix)]
+
+# Pipeline for LocalRedis: after watch() commands run immediately, after
+# multi() they are buffered, and execute() runs the buffer under the lock
+# unless a watched key changed in the meantime
+class LocalPipeline:
+    def __init__(self, server):
+        self.server = server
+        self.reset()
+
+    def reset(self):
+        self.watched = {}
+        self.commands = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def watch(self, *names):
+        with self.server.lock:
+            self.watched = {name: self.server.versions.get(name, 0) for name in names}
+
+    def multi(self):
+        self.commands = []
+
+    def execute(self):
+        with self.server.lock:
+            try:
+                if any(self.server.versions.get(name, 0) != version for name, version in self.watched.items()):
+                    raise WatchError('Watched variable changed.')
+                return [getattr(self.server, name)(*args, **kwargs) for name, args, kwargs in self.commands or []]
+            finally:
+                self.reset()
+
+    def __getattr__(self, name):
+        command = getattr(self.server, name)
+        if self.commands is None:
+            return command
+
+        def buffered(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return buffered
+
+# Open the queue named on the command line: a redis:// URL or a SQLite file path
+def open_queue(location=queue_path):
+    if location.startswith('redis://'):
+        if redis is None:
+            raise ImportError("The redis package is required for a Redis queue (pip install redis)")
+        return RedisQueue(redis.Redis.from_url(location, decode_responses=True))
+    return SQLiteQueue(location)
+
+# Chart specs for a full refresh: the overall chart, one per team and one per
+# top player (the player highlighted on the overall chart)
+def refresh_specs(df, dpi=300, teams=True, players=0, avatars=True):
+    base = {'dpi': dpi, 'avatars': avatars}
+    specs = [base]
+    if teams:
+        for team in sorted(df['TEAM_ABBREVIATION'].dropna().unique()):
+            specs.append({**base, 'filters': {'teams': [team]}})
+    if players:
+        frame = chart_spec.compute_frame({'avatars': False, 'top_n': players}, df)
+        specs += [{**base, 'highlight': [int(player_id)]} for player_id in frame['PLAYER_ID']]
+    return specs
+
+# Coordinator: enqueue every spec for a snapshot, returning (new, duplicate) counts
+def enqueue_specs(queue, snapshot_id, specs):
+    new = sum(queue.enqueue(snapshot_id, spec) for spec in specs)
+    return new, len(specs) - new
+
+# Renews a job's lease in the background while the worker renders
+class LeaseKeeper(threading.Thread):
+    def __init__(self, queue, key, worker_id, lease=lease_seconds):
+        super().__init__(daemon=True)
+        self.queue, self.key, self.worker_id, self.lease = queue, key, worker_id, lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.lease / 3):
+            if not self.queue.heartbeat(self.key, self.worker_id, self.lease):
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+# Stateless render worker: claim a job, rebuild its snapshot, render it with the
+# chart spec renderer and report the image path. Nothing but the last loaded
+# snapshot is kept between jobs, so any number of workers can run on any host.
+def run_worker(queue, worker_id=None, store=None, root=chart_spec.cache_dir, lease=lease_seconds,
+               once=False, idle_wait=idle_wait):
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    store = store or snapshot_store.SnapshotStore()
+    loaded = {}
+    rendered = 0
+
+    while True:
+        job = queue.claim(worker_id, lease)
+        if job is None:
+            if once:
+                return rendered
+            time.sleep(idle_wait)
+            continue
+
+        keeper = LeaseKeeper(queue, job['id'], worker_id, lease)
+        keeper.start()
+        try:
+            if job['snapshot_id'] not in loaded:
+                df = store.at(job['snapshot_id'])
+                loaded = {job['snapshot_id']: (df, chart_spec.dataset_fingerprint(df))}
+            df, fingerprint = loaded[job['snapshot_id']]
+            result = chart_spec.render_spec(job['spec'], df, fingerprint, root)
+        except Exception as e:
+            keeper.stop()
+            queue.fail(job['id'], worker_id, f'{type(e).__name__}: {e}')
+            print(f"[{worker_id}] Job {job['id'][:12]} failed (attempt {job['attempts']}): {e}")
+            continue
+        keeper.stop()
+
+        if queue.complete(job['id'], worker_id, result['image_path']):
+            rendered += 1
+            print(f"[{worker_id}] Rendered {result['image_path']}")
+        else:
+            print(f"[{worker_id}] Lost the lease on job {job['id'][:12]}; result left to the new owner")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distribute chart rendering over a shared work queue.')
+    parser.add_argument('--queue', default=queue_path, help='SQLite file or redis:// URL')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = commands.add_parser('enqueue', help='Queue the charts for a snapshot')
+    enqueue_parser.add_argument('--snapshot', default=None, help='Snapshot ID (YYYY-MM-DD/part-NNNN), default latest')
+    enqueue_parser.add_argument('--specs', nargs='*', default=None, help='Chart spec files instead of a full refresh')
+    enqueue_parser.add_argument('--dpi', type=int, default=300)
+    enqueue_parser.add_argument('--players', type=int, default=0, help='Also queue a chart for each of the top N players')
+    enqueue_parser.add_argument('--no-teams', action='store_true')
+
+    work_parser = commands.add_parser('work', help='Render queued charts')
+    work_parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+    work_parser.add_argument('--lease', type=int, default=lease_seconds)
+
+    commands.add_parser('status', help='Show job counts by status')
+    args = parser.parse_args()
+
+    queue = open_queue(args.queue)
+    if args.command == 'enqueue':
+        store = snapshot_store.SnapshotStore()
+        snapshot_id = args.snapshot or store.latest_snapshot_id()
+        if snapshot_id is None:
+            raise SystemExit(f"No snapshots found in {store.root}")
+        if args.specs:
+            specs = [chart_spec.load_spec(path) for path in args.specs]
+        else:
+            specs = refresh_specs(store.at(snapshot_id), args.dpi, not args.no_teams, args.players)
+        new, duplicate = enqueue_specs(queue, snapshot_id, specs)
+        print(f"Queued {new} chart jobs for snapshot {snapshot_id} ({duplicate} already queued or done)")
+    elif args.command == 'work':
+        rendered = run_worker(queue, lease=args.lease, once=args.once)
+        print(f"Worker finished after rendering {rendered} charts")
+    else:
+        for status, total in sorted(queue.counts().items()):
+            print(f"{status}: {total}")
@@ -1,9 +1,21 @@
+import argparse
 import requests
 import pandas as pd
 import time
-import json
-from bs4 import BeautifulSoup
 import os
+from io import BytesIO
+from PIL import Image
+
+import delta_ingest
+import snapshot_store
+import raw_archive
+import avatar_fingerprint
+
+# lxml is much faster than BeautifulSoup's pure-Python html.parser
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
 
 # Create directories for data and images
 os.makedirs('data', exist_ok=True)
@@ -22,32 +34,6 @@ headers = {
     'Cache-Control': 'max-age=0'
 }
 
-print("Attempting to fetch NBA player statistics...")
-
-try:
-    # Make the request to the NBA stats page
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    
-    # Parse the HTML content
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    # Print the title to verify we got the right page
-    print(f"Page title: {soup.title.text}")
-    
-    # Save the HTML for inspection
-    with open('data/nba_stats_page.html', 'w', encoding='utf-8') as f:
-        f.write(response.text)
-    
-    print("HTML content saved to data/nba_stats_page.html")
-    
-    # Try to find the table with player stats
-    tables = soup.find_all('table')
-    print(f"Found {len(tables)} tables on the page")
-    
-except Exception as e:
-    print(f"Error fetching NBA stats: {e}")
-    
 # Since direct scraping might be challenging due to JavaScript rendering,
 # let's try using the NBA API endpoints
 
@@ -98,49 +84,57 @@ api_headers = {
     'Cache-Control': 'no-cache'
 }
 
-print("\nAttempting to fetch data from NBA API...")
+# NBA player headshot URL template
+headshot_url_template = "https://cdn.nba.com/headshots/nba/latest/1040x760/{player_id}.png"
 
-try:
-    # Make the API request
-    api_response = requests.get(api_url, headers=api_headers, params=params)
+# Get the page title and number of tables from an HTML document
+def inspect_html(text):
+    if lxml is not None:
+        tree = lxml.html.fromstring(text)
+        return tree.findtext('.//title'), len(tree.findall('.//table'))
+
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, 'html.parser')
+    return (soup.title.text if soup.title else None), len(soup.find_all('table'))
+
+# Fetch the NBA stats page and archive the HTML for inspection.
+# The page is rendered with JavaScript, so this is only useful for debugging.
+def fetch_stats_page():
+    # Make the request to the NBA stats page
+    response = requests.get(url, headers=headers)
+    response.raise_for_status()  # Raise an exception for HTTP errors
+
+    # Archive the HTML for inspection
+    entry = raw_archive.archive_payload(response.content, url, kind='html')
+    print(f"HTML content archived as {entry['hash'][:12]} ({'new' if entry['new'] else 'unchanged'})")
+
+    # Print the title and table count to verify we got the right page
+    title, table_count = inspect_html(response.content)
+    print(f"Page title: {title}")
+    print(f"Found {table_count} tables on the page")
+
+# Make the API request, optionally with extra headers (e.g. conditional request headers)
+def request_player_stats(request_params=None, extra_headers=None, timeout=30):
+    request_headers = dict(api_headers)
+    if extra_headers:
+        request_headers.update(extra_headers)
+    return requests.get(api_url, headers=request_headers, params=request_params or params, timeout=timeout)
+
+# Fetch the player stats payload from the NBA API
+def fetch_player_stats(request_params=None):
+    api_response = request_player_stats(request_params)
     api_response.raise_for_status()
-    
+
     # Parse the JSON response
-    data = api_response.json()
-    
-    # Save the raw JSON data
-    with open('data/nba_player_stats.json', 'w') as f:
-        json.dump(data, f)
-    
-    print("API data saved to data/nba_player_stats.json")
-    
-    # Try to extract the headers and rows
+    return api_response.json()
+
+# Build a DataFrame from the first result set of an API payload
+def player_stats_to_dataframe(data):
     if 'resultSets' in data and len(data['resultSets']) > 0:
-        headers = data['resultSets'][0]['headers']
+        columns = data['resultSets'][0]['headers']
         rows = data['resultSets'][0]['rowSet']
-        
-        # Create a DataFrame
-        df = pd.DataFrame(rows, columns=headers)
-        
-        # Save to CSV
-        df.to_csv('data/nba_player_stats.csv', index=False)
-        print("Player statistics saved to data/nba_player_stats.csv")
-        
-        # Print the first few rows to verify
-        print("\nFirst 5 players by points:")
-        print(df[['PLAYER_NAME', 'TEAM_ABBREVIATION', 'PTS', 'FGA']].head())
-        
-    else:
-        print("Could not find expected data structure in API response")
-        
-except Exception as e:
-    print(f"Error fetching from NBA API: {e}")
-
-# Now let's try to get player images
-print("\nSearching for player avatar images...")
-
-# NBA player headshot URL template
-headshot_url_template = "https://cdn.nba.com/headshots/nba/latest/1040x760/{player_id}.png"
+        return pd.DataFrame(rows, columns=columns)
+    return None
 
 # Function to download player headshots
 def download_player_image(player_id, player_name):
@@ -148,52 +142,129 @@ def download_player_image(player_id, player_name):
     try:
         img_response = requests.get(image_url, headers=headers)
         img_response.raise_for_status()
-        
+
+        # Skip the generic silhouette the CDN returns when it has no photo
+        if avatar_fingerprint.is_fallback_image(Image.open(BytesIO(img_response.content))):
+            print(f"Only a fallback headshot for {player_name}, will recheck later")
+            # Nothing is written here, so any stored avatar still needs replacing
+            avatar_fingerprint.flag_player(player_id, avatar_fingerprint.headshot_store, placeholder=False)
+            return None
+        avatar_fingerprint.clear_player(player_id, avatar_fingerprint.headshot_store)
+
         # Clean player name for filename
         clean_name = "".join(c if c.isalnum() else "_" for c in player_name)
-        
+
         # Save the image
         image_path = f'images/{clean_name}_{player_id}.png'
         with open(image_path, 'wb') as img_file:
             img_file.write(img_response.content)
-        
+
         return image_path
     except Exception as e:
         print(f"Error downloading image for {player_name}: {e}")
         return None
 
-# Try to download images for top players if we have the data
-try:
-    if 'df' in locals():
-        print("Downloading player headshots for top 30 players...")
-        
-        # Add a column for image paths
-        df['IMAGE_PATH'] = None
-        
-        # Download images for top 30 players by points
-        top_players = df.sort_values('PTS', ascending=False).head(30)
-        
-        for _, player in top_players.iterrows():
-            player_id = player['PLAYER_ID']
-            player_name = player['PLAYER_NAME']
-            
-            print(f"Downloading image for {player_name}...")
-            image_path = download_player_image(player_id, player_name)
-            
-            # Update the dataframe with the image path
-            if image_path:
-                df.loc[df['PLAYER_ID'] == player_id, 'IMAGE_PATH'] = image_path
-                print(f"Downloaded image for {player_name}")
-            
-            # Sleep to avoid rate limiting
-            time.sleep(0.5)
-        
-        # Save the updated dataframe
-        df.to_csv('data/nba_player_stats_with_images.csv', index=False)
-        print("Updated player statistics with image paths saved to data/nba_player_stats_with_images.csv")
-    else:
-        print("DataFrame not available, cannot download player images")
-except Exception as e:
-    print(f"Error in image download process: {e}")
-
-print("\nData collection process completed.")
+# Download headshots for the top players by points and record the image paths
+def download_top_player_images(df, count=30):
+    # Add a column for image paths
+    df['IMAGE_PATH'] = None
+
+    # Download images for top players by points
+    top_players = df.sort_values('PTS', ascending=False).head(count)
+    avatar_fingerprint.seed_fallback_table()
+
+    for _, player in top_players.iterrows():
+        player_id = player['PLAYER_ID']
+        player_name = player['PLAYER_NAME']
+
+        print(f"Downloading image for {player_name}...")
+        image_path = download_player_image(player_id, player_name)
+
+        # Update the dataframe with the image path
+        if image_path:
+            df.loc[df['PLAYER_ID'] == player_id, 'IMAGE_PATH'] = image_path
+            print(f"Downloaded image for {player_name}")
+
+        # Sleep to avoid rate limiting
+        time.sleep(0.5)
+
+    return df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch NBA player statistics.')
+    parser.add_argument('--html', action='store_true',
+                        help='Also fetch and inspect the (JavaScript-rendered) stats page HTML')
+    parser.add_argument('--advanced', action='store_true',
+                        help='Also fetch the Advanced, Usage and Scoring stat sets and join them on PLAYER_ID')
+    args = parser.parse_args()
+
+    if args.html:
+        print("Attempting to fetch NBA player statistics page...")
+
+        try:
+            fetch_stats_page()
+        except Exception as e:
+            print(f"Error fetching NBA stats: {e}")
+
+    print("\nAttempting to fetch data from NBA API...")
+
+    df = None
+    try:
+        if args.advanced:
+            # Fetch every stat set concurrently into one wide table
+            import stat_sets
+            df = stat_sets.fetch_enriched_player_stats()
+        else:
+            api_response = request_player_stats()
+            api_response.raise_for_status()
+
+            # Archive the raw JSON payload, compressed and deduplicated by content hash
+            entry = raw_archive.archive_payload(api_response.content, api_url, params)
+            print(f"API data archived as {entry['hash'][:12]} ({'new' if entry['new'] else 'unchanged'})")
+
+            data = api_response.json()
+
+            # Try to extract the headers and rows
+            df = player_stats_to_dataframe(data)
+
+        if df is not None:
+            # Diff against the stored snapshot and log only what changed
+            changeset = delta_ingest.diff_snapshots(delta_ingest.load_snapshot(), df)
+            if not delta_ingest.changeset_is_empty(changeset):
+                delta_ingest.append_change_log(changeset)
+            print(f"Changes since last snapshot: {delta_ingest.describe_changeset(changeset)}")
+
+            # Keep the day-over-day history in the snapshot store
+            snapshot_store.SnapshotStore().append(df)
+
+            # Save to CSV
+            df.to_csv('data/nba_player_stats.csv', index=False)
+            print("Player statistics saved to data/nba_player_stats.csv")
+
+            # Print the first few rows to verify
+            print("\nFirst 5 players by points:")
+            print(df[['PLAYER_NAME', 'TEAM_ABBREVIATION', 'PTS', 'FGA']].head())
+        else:
+            print("Could not find expected data structure in API response")
+
+    except Exception as e:
+        print(f"Error fetching from NBA API: {e}")
+
+    # Now let's try to get player images
+    print("\nSearching for player avatar images...")
+
+    # Try to download images for top players if we have the data
+    try:
+        if df is not None:
+            print("Downloading player headshots for top 30 players...")
+            df = download_top_player_images(df, 30)
+
+            # Save the updated dataframe
+            df.to_csv('data/nba_player_stats_with_images.csv', index=False)
+            print("Updated player statistics with image paths saved to data/nba_player_stats_with_images.csv")
+        else:
+            print("DataFrame not available, cannot download player images")
+    except Exception as e:
+        print(f"Error in image download process: {e}")
+
+    print("\nData collection process completed.")
@@ -0,0 +1,191 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import delta_ingest
+
+# Root of the date-partitioned snapshot store
+store_dir = 'data/snapshots'
+
+# Write a full keyframe after this many delta partitions
+keyframe_interval = 14
+
+key_column = delta_ingest.key_column
+
+# Write one partition as a compressed columnar .npz file, one array per column
+def write_partition(path, frame, kind, removed_ids=()):
+    arrays = {}
+    for column in frame.columns:
+        values = frame[column]
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            # Strings are stored as fixed-width unicode so no pickling is needed
+            arrays[column] = values.fillna('').astype(str).to_numpy(dtype=str)
+        else:
+            arrays[column] = values.to_numpy()
+
+    arrays['__columns__'] = np.array(list(frame.columns), dtype=str)
+    arrays['__kind__'] = np.array(kind)
+    arrays['__removed__'] = np.asarray(list(removed_ids), dtype=np.int64)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, path)
+
+# Read a partition back into (kind, frame, removed ids)
+def read_partition(path):
+    with np.load(path) as data:
+        columns = [str(column) for column in data['__columns__']]
+        frame = pd.DataFrame({column: data[column] for column in columns}, columns=columns)
+        # Restore the missing values that were written as empty strings
+        for column in columns:
+            if data[column].dtype.kind == 'U':
+                frame[column] = frame[column].astype(object).where(frame[column] != '', None)
+        return str(data['__kind__']), frame, data['__removed__'].tolist()
+
+# Append-only store of leaguedashplayerstats rows, partitioned by date.
+# Each partition holds either a keyframe (every row) or a delta (new and
+# changed rows plus removed player IDs) relative to the previous state.
+class SnapshotStore:
+    def __init__(self, root=store_dir, keyframe_interval=keyframe_interval):
+        self.root = root
+        self.keyframe_interval = keyframe_interval
+        self.partition_cache = {}
+        self.history_cache = None
+
+    # List partitions as (date, path) sorted by date and sequence number
+    def partitions(self):
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for name in sorted(os.listdir(self.root)):
+            if not name.startswith('date='):
+                continue
+            partition_dir = os.path.join(self.root, name)
+            for part in sorted(os.listdir(partition_dir)):
+                if part.endswith('.npz'):
+                    found.append((name[len('date='):], os.path.join(partition_dir, part)))
+        return found
+
+    def load(self, path):
+        if path not in self.partition_cache:
+            self.partition_cache[path] = read_partition(path)
+        return self.partition_cache[path]
+
+    # Rebuild the full table as of a date (YYYY-MM-DD) from the last keyframe and the deltas after it
+    def as_of(self, date=None):
+        date = str(pd.Timestamp(date).date()) if date is not None else None
+        return self.replay([(d, path) for d, path in self.partitions() if date is None or d <= date])
+
+    # Snapshot IDs name a single partition (YYYY-MM-DD/part-NNNN), so they stay
+    # fixed when more partitions are appended later on the same day
+    def snapshot_id(self, path):
+        return f"{os.path.basename(os.path.dirname(path))[len('date='):]}/{os.path.splitext(os.path.basename(path))[0]}"
+
+    def latest_snapshot_id(self):
+        existing = self.partitions()
+        return self.snapshot_id(existing[-1][1]) if existing else None
+
+    # Rebuild the full table exactly as it was when a partition was written
+    def at(self, snapshot_id):
+        existing = self.partitions()
+        ids = [self.snapshot_id(path) for _, path in existing]
+        if snapshot_id not in ids:
+            raise KeyError(f"No snapshot {snapshot_id} in {self.root}")
+        return self.replay(existing[:ids.index(snapshot_id) + 1])
+
+    # Apply the partitions in order, starting from the most recent keyframe
+    def replay(self, selected):
+        if not selected:
+            return None
+
+        # Walk back to the most recent keyframe
+        start = 0
+        for i in range(len(selected) - 1, -1, -1):
+            if self.load(selected[i][1])[0] == 'keyframe':
+                start = i
+                break
+
+        state = None
+        for _, path in selected[start:]:
+            kind, frame, removed_ids = self.load(path)
+            if kind == 'keyframe' or state is None:
+                state = frame.copy()
+                continue
+            affected = set(frame[key_column]) | set(removed_ids)
+            state = pd.concat([state[~state[key_column].isin(affected)], frame], ignore_index=True)
+        return state
+
+    # Store the rows fetched on a date, keeping only what changed since the previous state
+    def append(self, df, date=None):
+        date = str(pd.Timestamp(date or pd.Timestamp.now()).date())
+        existing = self.partitions()
+        previous = self.as_of(date) if existing else None
+
+        # Count deltas written since the last keyframe
+        deltas_since_keyframe = 0
+        for _, path in reversed(existing):
+            if self.load(path)[0] == 'keyframe':
+                break
+            deltas_since_keyframe += 1
+
+        partition_dir = os.path.join(self.root, f'date={date}')
+        sequence = len([path for d, path in existing if d == date])
+        path = os.path.join(partition_dir, f'part-{sequence:04d}.npz')
+
+        # Nothing is written when the rows are the same as the previous state
+        if previous is not None:
+            changeset = delta_ingest.diff_snapshots(previous, df)
+            if delta_ingest.changeset_is_empty(changeset):
+                return None
+
+        if previous is None or deltas_since_keyframe + 1 >= self.keyframe_interval:
+            write_partition(path, df, 'keyframe')
+            kind, stored = 'keyframe', len(df)
+        else:
+            changed = pd.concat([changeset['changed'], changeset['new']], ignore_index=True)
+            write_partition(path, changed, 'delta', changeset['removed'][key_column].tolist())
+            kind, stored = 'delta', len(changed)
+
+        self.history_cache = None
+        print(f"Snapshot {kind} stored for {date} ({stored} rows) in {path}")
+        return path
+
+    # Every stored row stacked with the date it took effect, loaded once and kept in memory
+    def history(self):
+        if self.history_cache is None:
+            frames = []
+            for date, path in self.partitions():
+                kind, frame, _ = self.load(path)
+                frames.append(frame.assign(SNAPSHOT_DATE=date, SNAPSHOT_KIND=kind))
+            self.history_cache = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return self.history_cache
+
+    # Every distinct state a player went through, one row per date the stats changed
+    def player_trajectory(self, player_id, columns=None):
+        history = self.history()
+        if history.empty:
+            return history
+
+        rows = history[history[key_column] == player_id]
+        stat_columns = columns or delta_ingest.stat_columns(rows.drop(columns=['SNAPSHOT_DATE', 'SNAPSHOT_KIND']))
+
+        # Keyframes repeat unchanged rows, so drop states identical to the one before
+        values = rows[stat_columns]
+        unchanged = (values == values.shift()).all(axis=1)
+        rows = rows[~unchanged]
+
+        keep = [key_column, 'SNAPSHOT_DATE'] + [column for column in stat_columns if column != key_column]
+        return rows[keep].reset_index(drop=True)
+
+if __name__ == '__main__':
+    # Add the current snapshot to the store
+    store = SnapshotStore()
+    snapshot = delta_ingest.load_snapshot()
+    if snapshot is None:
+        print("No snapshot found at data/nba_player_stats.csv, run scrape_nba_stats.py first")
+    else:
+        store.append(snapshot)
+        print(f"Store contains {len(store.partitions())} partitions")
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+import scrape_nba_stats as scraper
+import raw_archive
+
+# Stat sets fetched alongside the Base totals, as (MeasureType, PerMode).
+# Advanced adds TS_PCT, USG_PCT and PACE; Usage and Scoring add shot and
+# possession shares.
+measure_sets = [
+    ('Base', 'Totals'),
+    ('Advanced', 'Totals'),
+    ('Usage', 'Totals'),
+    ('Scoring', 'Totals'),
+]
+
+key_column = 'PLAYER_ID'
+
+# Fetch one stat set with a shared session and archive the raw payload
+def fetch_stat_set(session, measure_type, per_mode, base_params=None):
+    request_params = dict(base_params or scraper.params, MeasureType=measure_type, PerMode=per_mode)
+    response = session.get(scraper.api_url, headers=scraper.api_headers, params=request_params, timeout=30)
+    response.raise_for_status()
+    raw_archive.archive_payload(response.content, scraper.api_url, request_params)
+    return scraper.player_stats_to_dataframe(response.json())
+
+# Request every stat set concurrently; the whole fan-out takes about as long as the slowest request
+def fetch_stat_sets(sets=None, base_params=None, max_workers=None):
+    sets = sets or measure_sets
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers=max_workers or len(sets)) as executor:
+            futures = [executor.submit(fetch_stat_set, session, measure_type, per_mode, base_params)
+                       for measure_type, per_mode in sets]
+            return [future.result() for future in futures]
+
+# Join stat sets on PLAYER_ID into one wide table. Every frame is indexed and
+# sorted on the key once, and each later set only contributes the columns not
+# already present, so shared columns (names, GP, MIN, ...) are never copied twice.
+# Rows come back in the order of the first set (the API's points ranking).
+def join_stat_sets(frames):
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return None
+
+    order = frames[0][key_column]
+    base = frames[0].set_index(key_column).sort_index()
+    parts = [base]
+    seen = set(base.columns)
+
+    for frame in frames[1:]:
+        new_columns = [column for column in frame.columns if column != key_column and column not in seen]
+        if not new_columns:
+            continue
+        seen.update(new_columns)
+
+        part = frame.set_index(key_column)[new_columns].sort_index()
+        parts.append(part.reindex(base.index))
+
+    return pd.concat(parts, axis=1).loc[order].reset_index()
+
+# Fetch and join all stat sets into the enriched player table
+def fetch_enriched_player_stats(sets=None, base_params=None):
+    start = time.perf_counter()
+    df = join_stat_sets(fetch_stat_sets(sets, base_params))
+    if df is not None:
+        print(f"Fetched {len(sets or measure_sets)} stat sets ({len(df.columns)} columns) "
+              f"in {time.perf_counter() - start:.2f} s")
+    return df
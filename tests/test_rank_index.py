@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from rank_index import RankIndex
+
+def players(count=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'PLAYER_ID': np.arange(1, count + 1),
+        'TEAM_ABBREVIATION': rng.choice(['BOS', 'LAL', 'NYK'], count),
+        # Few distinct values, so most rows tie with others
+        'GP': rng.integers(60, 64, count),
+        'PTS': rng.integers(0, 5, count) * 100.0,
+        'FGA': rng.integers(0, 3, count) * 50.0,
+    })
+
+def test_update_matches_rebuild_with_ties():
+    index = RankIndex(players())
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        upserts = index.frame.sample(6, random_state=int(rng.integers(1000))).copy()
+        upserts['PTS'] = rng.integers(0, 5, len(upserts)) * 100.0
+        upserts['GP'] += 1
+        index.update(upserts)
+
+    rebuilt = RankIndex(index.frame)
+    for column in index.columns:
+        assert index.orders[column].tolist() == rebuilt.orders[column].tolist(), column
+        np.testing.assert_array_equal(index.percentiles[column], rebuilt.percentiles[column])
+
+def test_update_inserts_new_players_among_ties():
+    index = RankIndex(players())
+    new = pd.DataFrame({'PLAYER_ID': [101, 102], 'TEAM_ABBREVIATION': ['BOS', 'LAL'],
+                        'GP': [61, 62], 'PTS': [200.0, 200.0], 'FGA': [50.0, 0.0]})
+    index.update(new)
+
+    rebuilt = RankIndex(index.frame)
+    for column in index.columns:
+        assert index.orders[column].tolist() == rebuilt.orders[column].tolist(), column
+    assert index.top_k('PTS', 50)['PLAYER_ID'].tolist() == rebuilt.top_k('PTS', 50)['PLAYER_ID'].tolist()
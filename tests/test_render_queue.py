@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import chart_spec
+import render_queue
+import snapshot_store
+
+spec = {'avatars': False, 'dpi': 30}
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def queue(request, tmp_path):
+    if request.param == 'sqlite':
+        return render_queue.SQLiteQueue(str(tmp_path / 'queue.db'))
+    return render_queue.RedisQueue(render_queue.LocalRedis())
+
+def test_enqueue_deduplicates_jobs(queue):
+    assert queue.enqueue('2025-01-01/part-0000', spec)
+    assert not queue.enqueue('2025-01-01/part-0000', dict(spec))
+    assert queue.enqueue('2025-01-02/part-0000', spec)
+    assert queue.counts() == {'queued': 2}
+
+def test_done_job_is_not_queued_again(queue):
+    queue.enqueue('2025-01-01/part-0000', spec)
+    job = queue.claim('worker-a')
+    assert queue.complete(job['id'], 'worker-a', 'chart.png')
+    assert not queue.enqueue('2025-01-01/part-0000', spec)
+    assert queue.claim('worker-a') is None
+
+def test_failed_job_can_be_queued_again(queue):
+    queue.max_attempts = 1
+    queue.enqueue('2025-01-01/part-0000', spec)
+    job = queue.claim('worker-a')
+    queue.fail(job['id'], 'worker-a', 'boom')
+    assert queue.counts() == {'failed': 1}
+    assert queue.enqueue('2025-01-01/part-0000', spec)
+    assert queue.claim('worker-a')['id'] == job['id']
+
+def test_expired_lease_is_claimed_by_another_worker(queue):
+    queue.enqueue('2025-01-01/part-0000', spec)
+    job = queue.claim('worker-a', lease=0.05)
+    assert queue.claim('worker-b') is None
+    time.sleep(0.1)
+
+    retried = queue.claim('worker-b')
+    assert retried['id'] == job['id']
+    assert retried['attempts'] == 2
+
+    # The dead worker no longer owns the job
+    assert not queue.heartbeat(job['id'], 'worker-a')
+    assert not queue.complete(job['id'], 'worker-a', 'chart.png')
+    assert queue.complete(job['id'], 'worker-b', 'chart.png')
+    assert queue.counts() == {'done': 1}
+
+def test_heartbeat_keeps_the_lease(queue):
+    queue.enqueue('2025-01-01/part-0000', spec)
+    job = queue.claim('worker-a', lease=0.1)
+    for _ in range(3):
+        time.sleep(0.05)
+        assert queue.heartbeat(job['id'], 'worker-a', lease=0.1)
+    assert queue.claim('worker-b') is None
+
+def test_expired_leases_give_up_after_max_attempts(queue):
+    queue.enqueue('2025-01-01/part-0000', spec)
+    for attempt in range(1, render_queue.max_attempts + 1):
+        job = queue.claim(f'worker-{attempt}', lease=0.01)
+        assert job['attempts'] == attempt
+        time.sleep(0.03)
+    assert queue.claim('worker-last') is None
+    assert queue.counts() == {'failed': 1}
+
+def test_failures_give_up_after_max_attempts(queue):
+    queue.enqueue('2025-01-01/part-0000', spec)
+    for attempt in range(render_queue.max_attempts):
+        job = queue.claim('worker-a')
+        queue.fail(job['id'], 'worker-a', 'boom')
+    assert queue.claim('worker-a') is None
+    assert queue.counts() == {'failed': 1}
+
+def test_concurrent_claims_are_exclusive(queue):
+    for day in range(1, 21):
+        queue.enqueue(f'2025-01-{day:02d}/part-0000', spec)
+
+    claimed = []
+    def work(worker_id):
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                return
+            claimed.append(job['id'])
+
+    workers = [threading.Thread(target=work, args=(f'worker-{i}',)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(claimed) == 20
+    assert len(set(claimed)) == 20
+
+# A claim interrupted by another client before EXEC must not lose the job
+def test_redis_claim_retries_when_queue_changes():
+    client = render_queue.LocalRedis()
+    queue = render_queue.RedisQueue(client)
+    queue.enqueue('2025-01-01/part-0000', spec)
+
+    lindex = client.lindex
+    interrupted = []
+    def racing_lindex(name, index):
+        key = lindex(name, index)
+        if not interrupted:
+            interrupted.append(key)
+            queue.enqueue('2025-01-02/part-0000', spec)
+        return key
+    client.lindex = racing_lindex
+
+    job = queue.claim('worker-a')
+    assert job['id'] == interrupted[0]
+    assert client.zscore(queue.leases, job['id']) is not None
+    assert queue.counts() == {'running': 1, 'queued': 1}
+    assert queue.claim('worker-b')['snapshot_id'] == '2025-01-02/part-0000'
+
+def test_worker_renders_queued_snapshot(queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(chart_spec, 'result_cache', {})
+    df = pd.DataFrame({
+        'PLAYER_ID': range(1, 13),
+        'PLAYER_NAME': [f'Player {i}' for i in range(1, 13)],
+        'TEAM_ABBREVIATION': ['AAA', 'BBB'] * 6,
+        'GP': [60] * 12,
+        'PTS': [float(1000 + 50 * i) for i in range(12)],
+        'FGA': [float(900 + 20 * (i % 5)) for i in range(12)],
+    })
+    store = snapshot_store.SnapshotStore(str(tmp_path / 'snapshots'))
+    store.append(df, '2025-01-01')
+    snapshot_id = store.latest_snapshot_id()
+
+    assert render_queue.enqueue_specs(queue, snapshot_id, [spec, spec]) == (1, 1)
+    rendered = render_queue.run_worker(queue, 'worker-a', store, str(tmp_path / 'cache'), once=True)
+    assert rendered == 1
+    assert queue.counts() == {'done': 1}
+    assert os.listdir(tmp_path / 'cache')